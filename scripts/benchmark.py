@@ -0,0 +1,314 @@
+import os
+import sys
+import glob
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+import yaml
+from canonical import canonical_key
+from compile_cache import get_compile_cache
+from compile_server import get_compile_server
+from dataset import ProblemDataset
+from evaluator import Evaluator
+from run_code import COMPILE_FLAGS
+from scheduler import get_scheduler
+from solver import run_method
+from testfiles import load_tests
+from tracing import configure_tracing, current_problem, span
+
+
+class SimulatedGenerator:
+    """
+    Network-free stand-in for GLMGeneratorTree that samples recorded programs.
+
+    Every call draws from the problem's corpus with a random generator seeded by the
+    benchmark seed, the problem id, the prompt and how many times that prompt was asked
+    before, so a run is reproducible however the calls of a search interleave across
+    threads. Each call sleeps `latency` seconds (the samples of one call are drawn
+    concurrently, as with the sampling engine), which is accounted as LLM time.
+    """
+    def __init__(self, problem_id: int, programs: List[Dict[str, Any]], seed: int = 0, latency: float = 0.0,
+                 correct_rate: Optional[float] = None):
+        self.problem_id = problem_id
+        self.right = [program["code"] for program in programs if program.get("score", 0) == 1.0]
+        self.wrong = [program["code"] for program in programs if program.get("score", 0) != 1.0]
+        self.seed = seed
+        self.latency = latency
+        # Probability of drawing a correct program; None samples the recorded mix uniformly
+        self.correct_rate = correct_rate
+
+        self.calls = 0
+        self.samples = 0
+        self.llm_time = 0.0
+        self._lock = threading.Lock()
+        self._asked: Dict[str, int] = {}
+        # Thought -> the program it was derived from
+        self._approaches: Dict[str, str] = {}
+
+    def _draw(self, prompt: str, n: int, prefer: Optional[str] = None) -> List[str]:
+        with self._lock:
+            occurrence = self._asked.get(prompt, 0)
+            self._asked[prompt] = occurrence + 1
+            self.calls += 1
+            self.samples += n
+        digest = hashlib.sha256(f"{self.seed}\0{self.problem_id}\0{occurrence}\0{prompt}".encode("utf-8")).digest()
+        rng = random.Random(digest)
+        codes = []
+        for _ in range(n):
+            if prefer is not None and rng.random() < 0.5:
+                codes.append(prefer)
+                continue
+            if self.correct_rate is not None and self.right and self.wrong:
+                pool = self.right if rng.random() < self.correct_rate else self.wrong
+            else:
+                pool = self.right + self.wrong
+            codes.append(rng.choice(pool))
+
+        with span("llm.generate", n=n, simulated=True):
+            time.sleep(self.latency)
+        with self._lock:
+            self.llm_time += self.latency
+        return codes
+
+    def generate_code(self, n: int = 1, feedback: str = None, policy = "append") -> List[str]:
+        return self._draw(f"code\0{policy}\0{feedback or ''}", n)
+
+    def generate_thoughts(self, n: int = 1, feedback: List[str] = None, policy = "append") -> List[str]:
+        # A thought names a program, which code generated from it is biased towards
+        thoughts = []
+        for code in self._draw(f"thoughts\0{policy}\0" + "\0".join(feedback or []), n):
+            thought = f"Approach {canonical_key(code)[:8]}"
+            with self._lock:
+                self._approaches[thought] = code
+            thoughts.append(thought)
+        return thoughts
+
+    def generate_code_w_thoughts(self, thought: str = "", thoughts: List[str] = None):
+        thoughts = list(thoughts or []) + [thought]
+        with self._lock:
+            prefer = self._approaches.get(thought)
+        return self._draw("code_w_thoughts\0" + "\0".join(thoughts), 1, prefer)[0], thoughts
+
+
+def load_corpus(path: str) -> Dict[int, List[Dict[str, Any]]]:
+    """Read a corpus JSONL file ({"id", "code", "score"} per line) grouped by problem id."""
+    corpus: Dict[int, List[Dict[str, Any]]] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                corpus.setdefault(entry["id"], []).append(entry)
+    return corpus
+
+
+def build_corpus(results_dir: str, path: str) -> int:
+    """
+    Collect the programs of earlier runs into a corpus file.
+
+    Reads every `code_*.json`/`data_*.json` file paired with its `log_*.json` file and every
+    `journal_*.jsonl` under `results_dir`, and keeps one entry per distinct program of a problem.
+
+    Returns:
+        int: The number of programs written.
+    """
+    entries = []
+    for code_path in glob.glob(os.path.join(results_dir, "**", "*.json"), recursive=True):
+        name = os.path.basename(code_path)
+        if not name.startswith(("code_", "data_")):
+            continue
+        log_path = os.path.join(os.path.dirname(code_path), "log_" + name.split("_", 1)[1])
+        if not os.path.isfile(log_path):
+            continue
+        with open(code_path, "r") as f:
+            codes = {entry["question_id"]: entry["code_file"] for entry in json.load(f)}
+        with open(log_path, "r") as f:
+            for entry in json.load(f):
+                if entry["question_id"] in codes and "score" in entry:
+                    entries.append({"id": entry["question_id"], "code": codes[entry["question_id"]], "score": entry["score"]})
+    for journal_path in glob.glob(os.path.join(results_dir, "**", "journal_*.jsonl"), recursive=True):
+        with open(journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                entries.append({"id": record["question_id"], "code": record.get("code_file", ""), "score": record.get("score", 0)})
+
+    seen = set()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for entry in entries:
+            key = (entry["id"], canonical_key(entry["code"]))
+            if not entry["code"] or key in seen:
+                continue
+            seen.add(key)
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    return len(seen)
+
+
+def bench_problem(test_case: Dict[str, Any], programs: List[Dict[str, Any]], method_name: str, method_config: Dict[str, Any],
+                  eval_config: Dict[str, Any], pipeline_depth: int, dedup: str, parallel: int, transpositions: bool,
+                  fidelity_config: Dict[str, Any], args) -> Dict[str, Any]:
+    """Solve one problem with the simulated generator on the real compile/run path."""
+    current_problem.set(test_case["id"])
+    generator = SimulatedGenerator(test_case["id"], programs, args.seed, args.latency, args.correct_rate)
+    inputs, outputs = load_tests(test_case, os.path.dirname(args.data))
+    evaluator = Evaluator(inputs, outputs, fail_fast=eval_config.get("fail_fast", False),
+                          float_tolerance=eval_config.get("float_tolerance"), owner=test_case["id"])
+    start_time = time.time()
+    with span("solve", method=method_name):
+        _, score, _, budget = run_method(generator, evaluator, method_name, method_config, pipeline_depth, dedup, parallel,
+                                        transpositions, fidelity_config)
+    return {
+        "id": test_case["id"],
+        "score": score,
+        "budget": budget,
+        "calls": generator.calls,
+        "samples": generator.samples,
+        "llm_time": generator.llm_time,
+        "wall_time": time.time() - start_time,
+    }
+
+
+def bench_method(problems: List[Dict[str, Any]], corpus: Dict[int, List[Dict[str, Any]]], method_name: str, workers: int,
+                 config: Dict[str, Any], args) -> Dict[str, Any]:
+    """Run one method over every problem with `workers` problems in flight and aggregate the measurements."""
+    eval_config = config.get("evaluation") or {}
+    pipeline_depth = (config.get("pipeline") or {}).get("depth", 0)
+    dedup = (config.get("search") or {}).get("dedup", "tokens")
+    parallel = (config.get("search") or {}).get("parallel", 1)
+    transpositions = (config.get("search") or {}).get("transpositions", True)
+    fidelity_config = config.get("fidelity") or {}
+    method_config = config["method"][method_name]
+    if not args.warm:
+        get_compile_cache().clear()
+
+    compile_before = get_compile_server(COMPILE_FLAGS).stats()["compile_time"]
+    run_before = sum(get_scheduler().stats()["run_time"].values())
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="problem") as executor:
+        rows = list(executor.map(
+            lambda test_case: bench_problem(test_case, corpus[test_case["id"]], method_name, method_config,
+                                            eval_config, pipeline_depth, dedup, parallel, transpositions,
+                                            fidelity_config, args),
+            problems
+        ))
+    wall_time = time.time() - start_time
+
+    solved = [row for row in rows if row["score"] == 1.0]
+    return {
+        "method": method_name,
+        "workers": workers,
+        "problems": len(rows),
+        "solved": len(solved),
+        "mean_score": sum(row["score"] for row in rows) / len(rows) if rows else 0.0,
+        # Candidates evaluated until the first correct one, over solved problems
+        "samples_to_solve": sum(row["budget"] for row in solved) / len(solved) if solved else None,
+        "samples": sum(row["samples"] for row in rows),
+        "wall_time": wall_time,
+        "llm_time": sum(row["llm_time"] for row in rows),
+        "compile_time": get_compile_server(COMPILE_FLAGS).stats()["compile_time"] - compile_before,
+        "run_time": sum(get_scheduler().stats()["run_time"].values()) - run_before,
+        "throughput": len(rows) / wall_time if wall_time > 0 else 0.0,
+        "rows": rows,
+    }
+
+
+def print_report(report: List[Dict[str, Any]]) -> None:
+    print(f"{'method':<8} {'workers':>7} {'solved':>9} {'score':>6} {'to-solve':>8} {'samples':>7} "
+          f"{'wall':>8} {'llm':>8} {'compile':>8} {'run':>8} {'speedup':>7}")
+    single = {entry["method"]: entry["wall_time"] for entry in report if entry["workers"] == 1}
+    for entry in report:
+        to_solve = f"{entry['samples_to_solve']:.1f}" if entry["samples_to_solve"] is not None else "-"
+        speedup = f"{single[entry['method']] / entry['wall_time']:.2f}x" if entry["method"] in single and entry["wall_time"] > 0 else "-"
+        print(f"{entry['method']:<8} {entry['workers']:>7} {entry['solved']:>4}/{entry['problems']:<4} {entry['mean_score']:>6.2f} "
+              f"{to_solve:>8} {entry['samples']:>7} {entry['wall_time']:>7.1f}s {entry['llm_time']:>7.1f}s "
+              f"{entry['compile_time']:>7.1f}s {entry['run_time']:>7.1f}s {speedup:>7}")
+
+
+def compare(report: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float) -> List[str]:
+    """
+    Compare a report with a saved baseline.
+
+    Returns:
+        List[str]: One message per regression: fewer problems solved, or samples to solve or wall
+        time more than `tolerance` (relative) above the baseline. Pipelined searches consume
+        samples in completion order, so their sample counts can vary slightly between runs.
+    """
+    base = {(entry["method"], entry["workers"]): entry for entry in baseline}
+    regressions = []
+    for entry in report:
+        old = base.get((entry["method"], entry["workers"]))
+        if old is None:
+            continue
+        name = f"{entry['method']} x{entry['workers']}"
+        if entry["solved"] < old["solved"]:
+            regressions.append(f"{name}: solved {entry['solved']} < {old['solved']}")
+        if entry["samples_to_solve"] is not None and old["samples_to_solve"] is not None \
+                and entry["samples_to_solve"] > old["samples_to_solve"] * (1 + tolerance):
+            regressions.append(f"{name}: samples to solve {entry['samples_to_solve']:.1f} > {old['samples_to_solve']:.1f}")
+        if entry["wall_time"] > old["wall_time"] * (1 + tolerance):
+            regressions.append(f"{name}: wall time {entry['wall_time']:.1f}s > {old['wall_time']:.1f}s")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the search methods with a simulated LLM")
+    parser.add_argument('--corpus', type=str, default=os.path.join("data", "corpus.jsonl"), help='Recorded programs per problem (JSONL)')
+    parser.add_argument('--build_corpus', action='store_true', help='Rebuild the corpus from the results folder and exit')
+    parser.add_argument('--data', type=str, default=os.path.join("data", "data.jsonl"), help='Problem dataset')
+    parser.add_argument('--methods', type=str, nargs='+', help='Methods of config.yaml to run (default: all)')
+    parser.add_argument('-w', '--workers', type=int, nargs='+', default=[1], help='Numbers of problems solved concurrently')
+    parser.add_argument('--ids', type=int, nargs='+', help='Only benchmark the problems with these ids')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the simulated generator')
+    parser.add_argument('--latency', type=float, default=0.0, help='Simulated seconds per LLM call')
+    parser.add_argument('--correct_rate', type=float, help='Probability of sampling a correct program (default: the recorded mix)')
+    parser.add_argument('--warm', action='store_true', help='Keep the compile cache between runs')
+    parser.add_argument('--trace', type=str, help='Write phase timings to this trace file')
+    parser.add_argument('--save', type=str, help='Write the report to this JSON file')
+    parser.add_argument('--baseline', type=str, help='Fail if the report regresses against this saved report')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative increase of wall time and samples to solve')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.build_corpus:
+        print(f"Wrote {build_corpus('results', args.corpus)} programs to {args.corpus}")
+        sys.exit(0)
+
+    with open("config.yaml", "r") as file:
+        config = yaml.safe_load(file)
+    get_scheduler((config.get("evaluation") or {}).get("slots"))
+    # Keep the one-off precompiled header build out of the first measurement
+    get_compile_server(COMPILE_FLAGS).warm_up()
+    configure_tracing(args.trace)
+
+    corpus = load_corpus(args.corpus)
+    data = ProblemDataset(args.data)
+    ids = [id for id in data.select(args.ids) if id in corpus]
+    problems = list(data.iter_problems(ids))
+    if not problems:
+        sys.exit(f"No problem of {args.data} has programs in {args.corpus}")
+
+    report = []
+    for method_name in args.methods or list(config["method"]):
+        for workers in args.workers:
+            report.append(bench_method(problems, corpus, method_name, workers, config, args))
+    print_report(report)
+    configure_tracing(None)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=4)
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        sys.exit(1 if regressions else 0)
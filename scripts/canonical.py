@@ -0,0 +1,264 @@
+import re
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# "off": raw strings only; "tokens": ignore comments, whitespace and layout; "identifiers": also ignore the names the program declares
+DEDUP_MODES = ("off", "tokens", "identifiers")
+
+CPP_TOKEN = re.compile(r"""
+      (?P<comment>//[^\n]*|/\*.*?\*/)
+    | (?P<directive>\#(?:[^\n\\]|\\.)*)
+    | (?P<literal>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+    | (?P<number>\.?\d(?:[eEpP][+-]|[\w.'])*)
+    | (?P<identifier>[A-Za-z_]\w*)
+    | (?P<operator>\.\.\.|>>=|<<=|->\*|->|\+\+|--|<<|>>|&&|\|\||::|\.\*|[-+*/%&|^!=<>]=|\S)
+""", re.VERBOSE | re.DOTALL)
+# Literals inside a directive, whose whitespace is significant
+DIRECTIVE_LITERAL = re.compile(r"\"(?:\\.|[^\"\\\n])*\"|'(?:\\.|[^'\\\n])*'")
+WHITESPACE = re.compile(r"\s+")
+
+CPP_KEYWORDS = frozenset("""
+    alignas alignof and and_eq asm auto bitand bitor bool break case catch char char16_t char32_t class compl const
+    constexpr const_cast continue decltype default delete do double dynamic_cast else enum explicit export extern false
+    float for friend goto if inline int long mutable namespace new noexcept not not_eq nullptr operator or or_eq private
+    protected public register reinterpret_cast return short signed sizeof static static_assert static_cast struct switch
+    template this thread_local throw true try typedef typeid typename union unsigned using virtual void volatile wchar_t
+    while xor xor_eq
+""".split())
+
+# Library names that are never renamed, even where they look declared (e.g. `int main`): they are not interchangeable with other names
+CPP_LIBRARY_NAMES = frozenset("""
+    std main cin cout cerr endl printf scanf puts gets getchar putchar fgets fprintf sprintf sscanf freopen stdin stdout
+    ios ios_base sync_with_stdio tie string vector map set multimap multiset unordered_map unordered_set pair make_pair
+    tuple make_tuple get tie queue priority_queue deque stack list bitset array greater less first second size empty
+    push push_back pop_back pop_front push_front emplace emplace_back insert erase find count clear begin end rbegin rend
+    front back top resize reserve assign substr length lower_bound upper_bound equal_range binary_search sort stable_sort
+    reverse unique fill memset memcpy strlen strcmp strcpy max min swap abs fabs sqrt pow exp log log2 log10 floor ceil
+    round sin cos tan atan atan2 accumulate iota next_permutation prev_permutation max_element min_element __gcd gcd lcm
+    to_string stoi stol stoll stod atoi atol atoll getline int64_t uint64_t int32_t uint32_t size_t INT_MAX INT_MIN
+    LLONG_MAX LLONG_MIN LONG_MAX LONG_MIN INFINITY NULL EOF isdigit isalpha isspace isupper islower toupper tolower
+    setprecision fixed iterator const_iterator auto_ptr shared_ptr unique_ptr make_shared function
+""".split())
+
+
+# Keywords naming built-in types, after which (past qualifiers and pointers) a declarator follows
+CPP_TYPE_KEYWORDS = frozenset("auto bool char char16_t char32_t double float int long short signed unsigned void wchar_t".split())
+CPP_QUALIFIERS = frozenset("const constexpr extern inline mutable register static thread_local volatile".split())
+# Keywords after which the next identifier is a newly declared type or namespace
+CPP_DECLARING_KEYWORDS = frozenset("class enum namespace struct typename union".split())
+# Punctuation that cannot appear in a template argument list we recognize
+TEMPLATE_STOP_TOKENS = frozenset(("(", ")", ";", "{", "}", "&&", "||", "?"))
+
+
+def _normalize_directive(directive: str) -> str:
+    """Splice continued lines and collapse whitespace, except inside string and character literals."""
+    directive = directive.replace("\\\n", "")
+    parts = []
+    start = 0
+    for match in DIRECTIVE_LITERAL.finditer(directive):
+        parts.append(WHITESPACE.sub(" ", directive[start:match.start()]))
+        parts.append(match.group())
+        start = match.end()
+    parts.append(WHITESPACE.sub(" ", directive[start:]))
+    return "".join(parts).strip()
+
+
+def _lex(code: str) -> List[Tuple[str, str]]:
+    """(kind, token) pairs of C++ source, without comments; directives are whitespace-normalized outside literals."""
+    lexed = []
+    for match in CPP_TOKEN.finditer(code or ""):
+        kind = match.lastgroup
+        token = match.group()
+        if kind == "comment":
+            continue
+        if kind == "directive":
+            token = _normalize_directive(token)
+        lexed.append((kind, token))
+    return lexed
+
+
+def _skip_template(lexed: List[Tuple[str, str]], i: int) -> Optional[int]:
+    """Index after the template argument list opening at `lexed[i]` ("<"), or None if it is not one."""
+    depth = 0
+    for j in range(i, min(len(lexed), i + 64)):
+        token = lexed[j][1]
+        if token in TEMPLATE_STOP_TOKENS:
+            return None
+        if token == "<":
+            depth += 1
+        elif token == ">":
+            depth -= 1
+        elif token == ">>":
+            depth -= 2
+        if depth == 0:
+            return j + 1
+        if depth < 0:
+            return None
+    return None
+
+
+def declared_names(lexed: List[Tuple[str, str]]) -> Set[str]:
+    """
+    Names a translation unit declares itself: variables, parameters, functions, types and namespaces.
+
+    Declarations are recognized from their shape: a name after a built-in type (`long long x`,
+    `const int& n`), after another name or a template type (`ll x`, `vector<int> adj[N]`, `pii& p`),
+    after `struct`/`class`/`enum`/`union`/`namespace`/`typename`, or introduced by `typedef` or
+    `using X =`. Names only used (library functions, macros, members) are not returned; a missed
+    declaration only means the name is kept as written.
+    """
+    def is_name(j: int) -> bool:
+        return j < len(lexed) and lexed[j][0] == "identifier" and lexed[j][1] not in CPP_KEYWORDS
+
+    def skip_declarator_prefix(j: int) -> int:
+        while j < len(lexed) and (lexed[j][1] in CPP_QUALIFIERS or lexed[j][1] in ("*", "&", "&&")):
+            j += 1
+        return j
+
+    # User types first, so that `Node* p` can be told from a multiplication
+    types = set()
+    for i, (kind, token) in enumerate(lexed):
+        if token in CPP_DECLARING_KEYWORDS and not (i and lexed[i - 1][1] == "using"):
+            j = i + 1 + (i + 1 < len(lexed) and lexed[i + 1][1] in ("class", "struct"))
+            # A declaration head (`struct Node {`, `typename T>`), not a use such as `typename T::type`
+            if is_name(j) and j + 1 < len(lexed) and lexed[j + 1][1] in (",", ">", "=", "{", ":", ";"):
+                types.add(lexed[j][1])
+        elif token == "using" and is_name(i + 1) and i + 2 < len(lexed) and lexed[i + 2][1] == "=":
+            types.add(lexed[i + 1][1])
+        elif token == "typedef":
+            j = i + 1
+            while j < len(lexed) and lexed[j][1] not in (";", "{"):
+                j += 1
+            if j < len(lexed) and lexed[j][1] == ";" and is_name(j - 1):
+                types.add(lexed[j - 1][1])
+
+    declared = set(types)
+    for i, (kind, token) in enumerate(lexed):
+        if kind != "identifier" or (i and lexed[i - 1][1] in (".", "->", "::")):
+            continue
+        if token in CPP_TYPE_KEYWORDS:
+            j = i + 1
+            while j < len(lexed) and (lexed[j][1] in CPP_TYPE_KEYWORDS or lexed[j][1] in CPP_QUALIFIERS or lexed[j][1] in ("*", "&", "&&")):
+                j += 1
+            if is_name(j):
+                declared.add(lexed[j][1])
+        elif token not in CPP_KEYWORDS:
+            # `T name`, `T<...> name`, and `T* name` / `T& name` where T is surely a type
+            j = i + 1
+            templated = j < len(lexed) and lexed[j][1] == "<"
+            if templated:
+                j = _skip_template(lexed, j)
+                if j is None:
+                    continue
+            k = skip_declarator_prefix(j)
+            if is_name(k) and (k == i + 1 or templated or token in types or (i and lexed[i - 1][1] == "const")):
+                declared.add(lexed[k][1])
+    return declared
+
+
+def cpp_tokens(code: str, rename_identifiers: bool = False) -> List[str]:
+    """
+    Split C++ source into tokens, dropping comments and whitespace.
+
+    Preprocessor directives are kept as single whitespace-normalized tokens. With
+    `rename_identifiers`, every name the code declares itself (see `declared_names`) is replaced by
+    its order of first appearance, except well-known library names and member accesses; every other
+    name is kept, so programs calling different library functions never share a key.
+
+    Args:
+        code (str): The C++ source code.
+        rename_identifiers (bool): Whether to rename user identifiers.
+
+    Returns:
+        List[str]: The token stream.
+    """
+    lexed = _lex(code)
+    renamed = declared_names(lexed) - CPP_LIBRARY_NAMES if rename_identifiers else set()
+    tokens = []
+    names: Dict[str, str] = {}
+    for kind, token in lexed:
+        if kind == "identifier" and token in renamed and not (tokens and tokens[-1] in (".", "->", "::")):
+            token = names.setdefault(token, f"${len(names)}")
+        tokens.append(token)
+    return tokens
+
+
+def canonical_key(code: str, rename_identifiers: bool = False) -> str:
+    """Hash the canonical token stream of a program."""
+    return hashlib.sha256("\0".join(cpp_tokens(code, rename_identifiers)).encode("utf-8")).hexdigest()
+
+
+def text_key(text: str) -> str:
+    """Key of a natural-language action (e.g. a thought): whitespace-insensitive."""
+    return " ".join((text or "").split())
+
+
+def code_key(mode: str) -> Optional[Callable[[str], str]]:
+    """
+    Return the canonicalization function of a dedup mode.
+
+    Returns:
+        Optional[Callable[[str], str]]: None for "off", otherwise a function mapping code to its canonical key.
+    """
+    if mode not in DEDUP_MODES:
+        raise ValueError(f"Invalid dedup mode, should be one of {DEDUP_MODES}")
+    if mode == "off":
+        return None
+    rename_identifiers = mode == "identifiers"
+    return lambda code: canonical_key(code, rename_identifiers)
+
+
+def unique_actions(actions: Iterable[str], key: Callable[[str], str]) -> Dict[str, int]:
+    """
+    Group actions by canonical key.
+
+    Returns:
+        Dict[str, int]: The first action of every group (in sampling order) mapped to the size of its group.
+    """
+    representatives: Dict[str, str] = {}
+    counts: Dict[str, int] = {}
+    for action in actions:
+        action_key = key(action)
+        if action_key not in representatives:
+            representatives[action_key] = action
+            counts[action] = 0
+        counts[representatives[action_key]] += 1
+    return counts
+
+
+class RewardMemo:
+    """
+    `getReward` in front of which equivalent programs are evaluated once.
+
+    Rewards are memoized by canonical key for the lifetime of a search. Concurrent calls
+    for the same key wait for the first one instead of compiling and running the copy.
+    """
+    def __init__(self, getReward: Callable[[str], float], key: Callable[[str], str]):
+        self.getReward = getReward
+        self.key = key
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._rewards: Dict[str, Future] = {}
+
+    def __call__(self, code: str) -> float:
+        program_key = self.key(code)
+        with self._lock:
+            future = self._rewards.get(program_key)
+            if future is None:
+                future = self._rewards[program_key] = Future()
+                owner = True
+            else:
+                self.hits += 1
+                owner = False
+        if owner:
+            try:
+                future.set_result(self.getReward(code))
+            except BaseException as e:
+                # Let a later call retry instead of memoizing the failure
+                with self._lock:
+                    self._rewards.pop(program_key, None)
+                future.set_exception(e)
+                raise
+        return future.result()
@@ -1,36 +1,111 @@
 import json
 import os
+import argparse
+from collections import defaultdict
+from typing import Any, Dict, List
 
-# 替换为存放子文件夹的根目录路径
-base_path = "results"
-
-results = {}
-log = {}
-
-# 遍历 base_path 中的所有子文件夹
-for subdir in os.listdir(base_path):
-    subdir_path = os.path.join(base_path, subdir)
-
-    # 确保处理的是子文件夹
-    if os.path.isdir(subdir_path):
-        # 构造文件路径
-        result_path = os.path.join(subdir_path, f"code_{subdir}.json")
-        log_path = os.path.join(subdir_path, f"log_{subdir}.json")
-
-        # 检查文件是否存在并读取内容
-        if os.path.exists(result_path):
-            with open(result_path, "r") as f:
-                results[subdir] = json.load(f)
-
-        if os.path.exists(log_path):
-            with open(log_path, "r") as f:
-                log[subdir] = json.load(f)
-
-# 计算并打印每种方法的平均分数
-for method, result in log.items():
-    score_list = [case["score"] for case in result if "score" in case]
-    if score_list:
-        score = sum(score_list) / len(score_list)
-        print(f"Method: {method}, Average Score: {score:.2f}")
+
+def print_scores(base_path: str = "results"):
+    # base_path 为存放子文件夹的根目录路径
+    results = {}
+    log = {}
+
+    # 遍历 base_path 中的所有子文件夹
+    for subdir in os.listdir(base_path):
+        subdir_path = os.path.join(base_path, subdir)
+
+        # 确保处理的是子文件夹
+        if os.path.isdir(subdir_path):
+            # 构造文件路径
+            result_path = os.path.join(subdir_path, f"code_{subdir}.json")
+            log_path = os.path.join(subdir_path, f"log_{subdir}.json")
+
+            # 检查文件是否存在并读取内容
+            if os.path.exists(result_path):
+                with open(result_path, "r") as f:
+                    results[subdir] = json.load(f)
+
+            if os.path.exists(log_path):
+                with open(log_path, "r") as f:
+                    log[subdir] = json.load(f)
+
+    # 计算并打印每种方法的平均分数
+    for method, result in log.items():
+        score_list = [case["score"] for case in result if "score" in case]
+        if score_list:
+            score = sum(score_list) / len(score_list)
+            print(f"Method: {method}, Average Score: {score:.2f}")
+        else:
+            print(f"Method: {method}, No scores available.")
+
+
+def load_trace(path: str) -> List[Dict[str, Any]]:
+    """Read the complete ("X") events of a trace written by `tracing.Tracer`, skipping a torn last line."""
+    events = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip().rstrip(",")
+            if not line or line in ("[", "]"):
+                continue
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if event.get("ph") == "X":
+                events.append(event)
+    return events
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of sorted `values`."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))]
+
+
+def summarize_trace(path: str):
+    """
+    Print per-phase and per-problem time breakdowns of a trace.
+
+    Phase totals add up the spans of every thread, so phases that run in parallel (e.g. "run"
+    across run slots) can exceed the wall time of a problem.
+    """
+    events = load_trace(path)
+    durations = defaultdict(list)
+    per_problem = defaultdict(lambda: defaultdict(float))
+    tokens = defaultdict(int)
+    for event in events:
+        seconds = event["dur"] / 1e6
+        durations[event["name"]].append(seconds)
+        args = event.get("args", {})
+        if "problem" in args:
+            per_problem[args["problem"]][event["name"]] += seconds
+        for key in ("prompt_tokens", "completion_tokens"):
+            if args.get(key):
+                tokens[key] += args[key]
+
+    print(f"{'phase':<14} {'count':>7} {'total':>9} {'mean':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+    for name, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+        values.sort()
+        print(f"{name:<14} {len(values):>7} {sum(values):>8.1f}s {sum(values) / len(values) * 1e3:>7.1f}ms "
+              f"{percentile(values, 50) * 1e3:>7.1f}ms {percentile(values, 90) * 1e3:>7.1f}ms "
+              f"{percentile(values, 99) * 1e3:>7.1f}ms {values[-1] * 1e3:>7.1f}ms")
+    if tokens:
+        print(f"Tokens: {tokens['prompt_tokens']} prompt, {tokens['completion_tokens']} completion")
+
+    if per_problem:
+        phases = ["solve", "llm.generate", "llm.request", "evaluate", "compile", "run", "compare"]
+        print()
+        print(f"{'problem':>8} " + " ".join(f"{phase:>12}" for phase in phases))
+        for problem, totals in sorted(per_problem.items()):
+            print(f"{problem:>8} " + " ".join(f"{totals.get(phase, 0.0):>11.1f}s" for phase in phases))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize scores, or the phase timings of a trace")
+    parser.add_argument('--trace', type=str, help='Trace file written with --trace or tracing.path in config.yaml')
+    args = parser.parse_args()
+    if args.trace:
+        summarize_trace(args.trace)
     else:
-        print(f"Method: {method}, No scores available.")
+        print_scores()
@@ -0,0 +1,77 @@
+import re
+import math
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+# A maximal run of non-whitespace bytes
+TOKEN = re.compile(rb'\S+')
+
+
+def iter_tokens(data: bytes) -> Iterator[bytes]:
+    """Yield the whitespace-separated tokens of `data` one at a time, without splitting it up front."""
+    for match in TOKEN.finditer(data):
+        yield match.group()
+
+
+def _parse_float(token: bytes) -> Optional[float]:
+    try:
+        value = float(token)
+    except ValueError:
+        return None
+    return value if math.isfinite(value) else None
+
+
+def iter_expected(answer: bytes, float_tolerance: Optional[float] = None) -> Iterator[Tuple[bytes, Optional[float]]]:
+    """Lazily yield the (token, numeric value or None) pairs of an expected output, e.g. from a memory map."""
+    for token in iter_tokens(answer):
+        yield token, _parse_float(token) if float_tolerance is not None else None
+
+
+def normalize_expected(answer: Union[str, bytes], float_tolerance: Optional[float] = None) -> List[Tuple[bytes, Optional[float]]]:
+    """
+    Pre-normalize an expected output into the token form used by `compare_output`.
+
+    Args:
+        answer (Union[str, bytes]): The expected output.
+        float_tolerance (Optional[float]): If set, numeric tokens are parsed once here for tolerant comparison.
+
+    Returns:
+        List[Tuple[bytes, Optional[float]]]: (token, numeric value or None) for every token of the answer.
+    """
+    if isinstance(answer, str):
+        answer = answer.encode("utf-8")
+    return list(iter_expected(answer, float_tolerance))
+
+
+def compare_output(output: Union[str, bytes], expected: Iterable[Tuple[bytes, Optional[float]]], float_tolerance: Optional[float] = None) -> bool:
+    """
+    Compare a program output with a pre-normalized expected output token by token.
+
+    Tokens are consumed lazily, so the comparison stops at the first mismatch and never
+    tokenizes more of a long wrong output than needed. With `float_tolerance`, two
+    numeric tokens match if they differ by at most that much in absolute or relative terms.
+
+    Args:
+        output (Union[str, bytes]): The captured stdout of the program.
+        expected (Iterable[Tuple[bytes, Optional[float]]]): The answer as returned by `normalize_expected`
+            or `iter_expected`.
+        float_tolerance (Optional[float]): Absolute/relative tolerance for numeric tokens (None for exact match).
+
+    Returns:
+        bool: Whether the output is accepted.
+    """
+    if isinstance(output, str):
+        output = output.encode("utf-8")
+
+    tokens = iter_tokens(output)
+    for expected_token, expected_value in expected:
+        token = next(tokens, None)
+        if token is None:
+            return False
+        if token == expected_token:
+            continue
+        if float_tolerance is None or expected_value is None:
+            return False
+        value = _parse_float(token)
+        if value is None or not math.isclose(value, expected_value, rel_tol=float_tolerance, abs_tol=float_tolerance):
+            return False
+    return next(tokens, None) is None
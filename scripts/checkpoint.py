@@ -0,0 +1,192 @@
+import os
+import gzip
+import json
+import time
+import signal
+import threading
+from typing import Any, Dict, List, Optional
+
+# Node attributes that only describe work in flight and are reset on restore
+TRANSIENT_FIELDS = ("children", "parent", "parents", "virtual_loss", "pending", "sampling")
+# Tree settings a snapshot must agree with to be restored
+SNAPSHOT_SETTINGS = ("step", "bp_policy", "derive_policy")
+SNAPSHOT_VERSION = 2
+
+# Incremented to ask every running search for a snapshot at its next step
+_snapshot_generation = 0
+# Set when the run is interrupted: searches take a snapshot and stop at their next step
+_stop = threading.Event()
+
+
+def request_snapshot(signum=None, frame=None) -> None:
+    """Ask running searches for a snapshot (usable as a signal handler)."""
+    global _snapshot_generation
+    _snapshot_generation += 1
+
+
+def stop_requested() -> bool:
+    return _stop.is_set()
+
+
+def _interrupt(signum, frame) -> None:
+    # Searches stop at their next step boundary (see `Tree.checkpoint_step`); a second signal aborts at once
+    if _stop.is_set():
+        raise KeyboardInterrupt
+    request_snapshot()
+    _stop.set()
+
+
+def install_signal_handlers() -> None:
+    """
+    SIGUSR1 snapshots every running search. SIGINT and SIGTERM interrupt the run: every search,
+    including those in worker threads, snapshots its tree and stops at its next step boundary.
+    A second SIGINT or SIGTERM raises KeyboardInterrupt at once.
+    """
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, request_snapshot)
+    signal.signal(signal.SIGINT, _interrupt)
+    signal.signal(signal.SIGTERM, _interrupt)
+
+
+def _node_fields(node) -> List[str]:
+    fields = []
+    for cls in type(node).__mro__:
+        for field in getattr(cls, "__slots__", ()):
+            if field not in TRANSIENT_FIELDS and field not in fields:
+                fields.append(field)
+    return fields
+
+
+def snapshot_tree(tree) -> Dict[str, Any]:
+    """
+    Serialize the state of a tree search: every node (with its untried actions, visits, values and
+    scores), the shared structure of a DAG, the tracked best nodes and the budget spent.
+
+    Actions popped for evaluations still in flight (`tree.in_flight`) are saved as untried.
+    """
+    nodes = [tree.root]
+    index = {id(tree.root): 0}
+    for node in nodes:
+        for child in node.children:
+            if id(child) not in index:
+                index[id(child)] = len(nodes)
+                nodes.append(child)
+
+    in_flight: Dict[int, List[str]] = {}
+    for node, action in getattr(tree, "in_flight", {}).values():
+        if action is not None:
+            in_flight.setdefault(id(node), []).append(action)
+
+    fields = _node_fields(tree.root)
+    records = []
+    for node in nodes:
+        record = {field: getattr(node, field) for field in fields}
+        record["score"] = float(node.score)
+        if id(node) in in_flight and node.actions is not None:
+            record["actions"] = node.actions + in_flight[id(node)]
+        record["parent"] = index[id(node.parent)] if node.parent is not None else None
+        record["children"] = [index[id(child)] for child in node.children]
+        records.append(record)
+
+    def position(node) -> Optional[int]:
+        return index.get(id(node)) if node is not None else None
+
+    return {
+        "version": SNAPSHOT_VERSION,
+        "tree": type(tree).__name__,
+        "settings": {name: getattr(tree, name) for name in SNAPSHOT_SETTINGS},
+        "spent": tree.spent,
+        "best_node": position(tree.best_node),
+        "partial_candidates": [position(node) for node in tree.partial_candidates],
+        "nodes": records,
+    }
+
+
+def restore_tree(tree, data: Dict[str, Any]) -> None:
+    """Load a snapshot taken by `snapshot_tree` into a freshly constructed tree of the same kind and settings."""
+    if data.get("version") != SNAPSHOT_VERSION or data.get("tree") != type(tree).__name__:
+        raise ValueError(f"Snapshot of a {data.get('tree')} (version {data.get('version')}) cannot be restored into a {type(tree).__name__}")
+    settings = {name: getattr(tree, name) for name in SNAPSHOT_SETTINGS}
+    if data["settings"] != settings:
+        raise ValueError(f"Snapshot settings {data['settings']} differ from the search settings {settings}")
+
+    node_class = type(tree.root)
+    nodes = []
+    for record in data["nodes"]:
+        node = node_class()
+        for field, value in record.items():
+            if field not in ("parent", "children"):
+                setattr(node, field, value)
+        nodes.append(node)
+    for node, record in zip(nodes, data["nodes"]):
+        node.children = [nodes[child] for child in record["children"]]
+        if record["parent"] is not None:
+            node.parent = nodes[record["parent"]]
+    # Parents other than the one that created a node come from the transposition table
+    for parent in nodes:
+        for child in parent.children:
+            if child.parent is not parent:
+                if child.parents is None:
+                    child.parents = []
+                child.parents.append(parent)
+
+    tree.root = nodes[0]
+    if tree.table is not None:
+        for node in nodes[1:]:
+            tree.table.add(node)
+    tree.best_node = nodes[data["best_node"]] if data["best_node"] is not None else None
+    tree.partial_candidates = [nodes[position] for position in data["partial_candidates"]]
+    tree.spent = data["spent"]
+
+
+class SearchCheckpoint:
+    """
+    Snapshots of one tree search in a gzip-compressed JSON file.
+
+    The trees draw no random numbers, so a sequential search resumes exactly where it stopped. Parallel
+    MCTS and concurrent rollouts resume from a consistent state, but depend on completion order.
+
+    A snapshot is written every `interval` seconds (checked between expansions), when requested
+    through `request_snapshot`, when the search is interrupted and when it ends. A search restores
+    the snapshot at `path` if there is one, and otherwise the one at `warm_start` (e.g. a finished
+    search of the same problem with a smaller budget), which it then continues within its own budget.
+    """
+    def __init__(self, path: str, interval: float = 60.0, warm_start: Optional[str] = None):
+        self.path = path
+        self.interval = interval
+        self.warm_start = warm_start
+        self._last_save = time.monotonic()
+        self._generation = _snapshot_generation
+
+    def due(self) -> bool:
+        return self._generation != _snapshot_generation or time.monotonic() - self._last_save >= self.interval
+
+    def save(self, tree) -> None:
+        """Write a snapshot of `tree` atomically."""
+        data = snapshot_tree(tree)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".part"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+        self._last_save = time.monotonic()
+        self._generation = _snapshot_generation
+
+    def restore(self, tree) -> bool:
+        """
+        Load the snapshot of this search (or the warm-start one) into `tree`.
+
+        Returns:
+            bool: Whether a snapshot was restored. Unreadable or mismatching snapshots are reported and skipped.
+        """
+        for path in (self.path, self.warm_start):
+            if not path or not os.path.exists(path):
+                continue
+            try:
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    restore_tree(tree, json.load(f))
+            except (OSError, ValueError, KeyError, IndexError) as e:
+                print(f"Ignoring snapshot {path}: {e}")
+                continue
+            return True
+        return False
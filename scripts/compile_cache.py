@@ -0,0 +1,189 @@
+import os
+import hashlib
+import shutil
+import tempfile
+import threading
+from typing import List, Optional, Tuple
+
+
+def normalize_source(code: str) -> str:
+    """
+    Normalize C++ source so that cosmetic differences do not defeat the cache.
+
+    Args:
+        code (str): The C++ source code.
+
+    Returns:
+        str: The source with unified line endings, no trailing whitespace and no leading/trailing blank lines.
+    """
+    lines = code.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n") + "\n"
+
+
+def source_key(code: str, flags: List[str]) -> str:
+    """Hash the normalized source together with the compiler flags."""
+    digest = hashlib.sha256()
+    digest.update("\0".join(flags).encode("utf-8"))
+    digest.update(b"\0\0")
+    digest.update(normalize_source(code).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class CompileCache:
+    """
+    Content-addressed on-disk cache of compiled executables.
+
+    Entries are keyed by a hash of the normalized source plus the compiler flags.
+    A successful compilation is stored as `<key>.exe`, a failed one as `<key>.err`
+    holding the compiler diagnostics; only failures g++ reported with diagnostics are
+    stored, never ones caused by the machine (see `CompileServer.submit`). Entries are
+    written to a temporary file and atomically renamed into place, and hits are
+    hard-linked (or copied) out of the cache, so concurrent processes and eviction
+    never observe partial files.
+    """
+    def __init__(self, cache_dir: str = os.path.join("tmp", "cache"), max_bytes: int = 512 * 1024 * 1024, max_entries: int = 2048):
+        self.cache_dir = cache_dir
+        # Upper bound on the total size of the cache directory in bytes
+        self.max_bytes = max_bytes
+        # Upper bound on the number of cached entries
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, code: str, flags: List[str]) -> str:
+        """Compute the cache key of a source/flags pair."""
+        return source_key(code, flags)
+
+    def _entry_path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def fetch(self, key: str, exe_file_path: str) -> Optional[Tuple[bool, str]]:
+        """
+        Look up a compilation result.
+
+        Args:
+            key (str): The cache key returned by `key`.
+            exe_file_path (str): Where to place the cached executable on a successful hit.
+
+        Returns:
+            Optional[Tuple[bool, str]]: None on a miss, otherwise (compiled successfully, compiler stderr).
+        """
+        exe_entry = self._entry_path(key, ".exe")
+        err_entry = self._entry_path(key, ".err")
+        try:
+            if os.path.exists(exe_entry):
+                try:
+                    os.link(exe_entry, exe_file_path)
+                except OSError:
+                    shutil.copy2(exe_entry, exe_file_path)
+                os.utime(exe_entry)  # Refresh recency for LRU eviction
+                result = (True, "")
+            elif os.path.exists(err_entry):
+                with open(err_entry, "r", encoding="utf-8") as f:
+                    stderr = f.read()
+                os.utime(err_entry)
+                result = (False, stderr)
+            else:
+                result = None
+        except FileNotFoundError:
+            # The entry was evicted between the existence check and the read
+            result = None
+
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def store(self, key: str, exe_file_path: Optional[str], stderr: str = "") -> None:
+        """
+        Insert a compilation result into the cache.
+
+        Args:
+            key (str): The cache key returned by `key`.
+            exe_file_path (Optional[str]): Path to the compiled executable, or None if compilation failed.
+            stderr (str): The compiler diagnostics of a failed compilation.
+        """
+        suffix = ".exe" if exe_file_path else ".err"
+        fd, tmp_path = tempfile.mkstemp(suffix=".part", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if exe_file_path:
+                    with open(exe_file_path, "rb") as exe:
+                        shutil.copyfileobj(exe, f)
+                else:
+                    f.write(stderr.encode("utf-8"))
+            if exe_file_path:
+                shutil.copymode(exe_file_path, tmp_path)
+            os.replace(tmp_path, self._entry_path(key, suffix))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits its size and entry limits."""
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith((".exe", ".err")):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+            entries.sort()
+            while entries and (total > self.max_bytes or len(entries) > self.max_entries):
+                _, size, path = entries.pop(0)
+                try:
+                    os.remove(path)
+                except OSError:
+                    # Another process removed it already, or it is still locked on Windows
+                    continue
+                total -= size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove every entry, e.g. to measure cold compilations."""
+        with self._lock:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith((".exe", ".err")):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except OSError:
+                        continue
+
+    def stats(self) -> dict:
+        """Return the hit/miss/eviction counters of this cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_default_cache: Optional[CompileCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_compile_cache() -> CompileCache:
+    """Return the process-wide compile cache, creating it on first use."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = CompileCache()
+        return _default_cache
@@ -0,0 +1,133 @@
+import os
+import re
+import atexit
+import time
+import subprocess
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+# Matches sources that pull in the whole standard library through the GNU catch-all header
+STDCXX_INCLUDE = re.compile(r'^\s*#\s*include\s*<bits/stdc\+\+\.h>', re.MULTILINE)
+# Failures of the toolchain or the machine rather than of the source, e.g. cc1plus killed by the OOM killer
+TOOLCHAIN_FAILURE = re.compile(
+    r'signal terminated program|internal compiler error|No space left on device|Cannot allocate memory'
+    r'|virtual memory exhausted|out of memory allocating'
+)
+# g++ exits with 1 when it rejects the source with a diagnostic
+DIAGNOSTIC_EXIT_CODE = 1
+
+
+class CompileServer:
+    """
+    Long-lived pool of compile workers sharing a precompiled standard header.
+
+    The first compilation that needs it builds `<pch_dir>/stdc++.h.gch` from
+    `<bits/stdc++.h>` with the same flags used for candidates. Afterwards every
+    candidate that includes `<bits/stdc++.h>` is compiled with `-include` of the
+    precompiled header, so g++ only parses the candidate's own translation unit.
+    Sources that do not include the catch-all header are compiled unchanged, as
+    force-including the whole library could change how they resolve names.
+    """
+    def __init__(self, flags: List[str], pch_dir: str = os.path.join("tmp", "pch"), max_workers: Optional[int] = None):
+        self.flags = list(flags)
+        self.pch_dir = pch_dir
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count() or 1, thread_name_prefix="compile")
+
+        self._pch_header = os.path.join(self.pch_dir, "stdc++.h")
+        # None: not built yet, True: usable, False: building failed so compile without it
+        self._pch_ready: Optional[bool] = None
+        self._pch_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self.compiles = 0
+        self.compile_time = 0.0
+
+    def _build_pch(self) -> bool:
+        """Build the precompiled header once; return whether it is usable."""
+        with self._pch_lock:
+            if self._pch_ready is not None:
+                return self._pch_ready
+
+            os.makedirs(self.pch_dir, exist_ok=True)
+            gch_path = self._pch_header + ".gch"
+            with open(self._pch_header, "w", encoding="utf-8") as f:
+                f.write("#include <bits/stdc++.h>\n")
+
+            # Build under a temporary name so concurrent servers never pick up a partial file
+            part_path = f"{gch_path}.{os.getpid()}.part"
+            process = subprocess.run(
+                ["g++"] + self.flags + ["-x", "c++-header", self._pch_header, "-o", part_path],
+                capture_output=True, text=True, encoding="utf-8"
+            )
+            if process.returncode == 0:
+                os.replace(part_path, gch_path)
+                self._pch_ready = True
+            else:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+                self._pch_ready = False
+            return self._pch_ready
+
+    def warm_up(self) -> bool:
+        """Build the precompiled header ahead of the first compilation; return whether it is usable."""
+        return self._build_pch()
+
+    def _compile(self, code: str, cpp_file_path: str, exe_file_path: str) -> Tuple[bool, str]:
+        compile_cmd = ["g++"] + self.flags
+        if STDCXX_INCLUDE.search(code) and self._build_pch():
+            compile_cmd += ["-include", self._pch_header]
+        compile_cmd += [cpp_file_path, "-o", exe_file_path]
+
+        start_time = time.time()
+        compile_process = subprocess.run(
+            compile_cmd, capture_output=True, text=True, encoding="utf-8"
+        )
+        with self._stats_lock:
+            self.compiles += 1
+            self.compile_time += time.time() - start_time
+        if compile_process.returncode not in (0, DIAGNOSTIC_EXIT_CODE) or TOOLCHAIN_FAILURE.search(compile_process.stderr):
+            raise RuntimeError(f"g++ failed without judging the source (exit code {compile_process.returncode}): "
+                               f"{compile_process.stderr.strip()}")
+        return compile_process.returncode == 0, compile_process.stderr
+
+    def submit(self, code: str, cpp_file_path: str, exe_file_path: str) -> Future:
+        """
+        Queue a compilation on the worker pool.
+
+        Args:
+            code (str): The C++11 code as a string (already written to `cpp_file_path`).
+            cpp_file_path (str): Path to the source file.
+            exe_file_path (str): Path where the executable should be placed.
+
+        Returns:
+            Future: Resolves to (compiled successfully, compiler stderr), or raises RuntimeError when g++ was
+                killed or ran out of memory or disk space, so the outcome says nothing about the source.
+        """
+        return self.executor.submit(self._compile, code, cpp_file_path, exe_file_path)
+
+    def compile(self, code: str, cpp_file_path: str, exe_file_path: str) -> Tuple[bool, str]:
+        """Compile on the worker pool and wait for the result."""
+        return self.submit(code, cpp_file_path, exe_file_path).result()
+
+    def stats(self) -> dict:
+        """Return the number of compilations and the total time spent in g++."""
+        with self._stats_lock:
+            return {"compiles": self.compiles, "compile_time": self.compile_time, "pch": self._pch_ready}
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True)
+
+
+_default_server: Optional[CompileServer] = None
+_default_server_lock = threading.Lock()
+
+
+def get_compile_server(flags: List[str]) -> CompileServer:
+    """Return the process-wide compile server, starting it on first use."""
+    global _default_server
+    with _default_server_lock:
+        if _default_server is None:
+            _default_server = CompileServer(flags)
+            atexit.register(_default_server.shutdown)
+        return _default_server
@@ -0,0 +1,106 @@
+import os
+import re
+import json
+from typing import Any, Dict, Iterator, List, Optional
+
+# process_data.py writes "id" as the first key, so it can be read without parsing the whole line
+ID_PATTERN = re.compile(rb'^\{\s*"id"\s*:\s*(-?\d+)')
+
+
+class ProblemDataset:
+    """
+    Read-only view of data.jsonl indexed by problem id.
+
+    Only a byte-offset index is kept in memory; a problem is parsed when it is
+    requested. The index is cached next to the data file as `<file>.idx` and
+    rebuilt whenever the data file's size or modification time changes.
+    """
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.index_path = file_path + ".idx"
+        # Problem id -> byte offset of its line, in file order
+        self.offsets: Dict[int, int] = self._load_index()
+
+    def _signature(self) -> List[float]:
+        stat = os.stat(self.file_path)
+        return [stat.st_size, stat.st_mtime]
+
+    def _load_index(self) -> Dict[int, int]:
+        signature = self._signature()
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    cached = json.load(f)
+                if cached["signature"] == signature:
+                    return {int(id): offset for id, offset in cached["offsets"]}
+            except (ValueError, KeyError, TypeError):
+                pass
+
+        offsets = self._build_index()
+        try:
+            with open(self.index_path, "w", encoding="utf-8") as f:
+                json.dump({"signature": signature, "offsets": list(offsets.items())}, f)
+        except OSError:
+            # A read-only data directory only costs a rebuild next time
+            pass
+        return offsets
+
+    def _build_index(self) -> Dict[int, int]:
+        offsets: Dict[int, int] = {}
+        with open(self.file_path, "rb") as f:
+            offset = 0
+            for line in f:
+                if line.strip():
+                    match = ID_PATTERN.match(line)
+                    id = int(match.group(1)) if match else json.loads(line)["id"]
+                    offsets[id] = offset
+                offset += len(line)
+        return offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __contains__(self, id: int) -> bool:
+        return id in self.offsets
+
+    def ids(self) -> List[int]:
+        """Return the problem ids in file order."""
+        return list(self.offsets)
+
+    def __getitem__(self, id: int) -> Dict[str, Any]:
+        """Load and parse a single problem by id."""
+        with open(self.file_path, "rb") as f:
+            f.seek(self.offsets[id])
+            return json.loads(f.readline())
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Stream every problem in file order, parsing one line at a time."""
+        with open(self.file_path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def select(self, ids: Optional[List[int]] = None, start: Optional[int] = None, end: Optional[int] = None) -> List[int]:
+        """
+        Filter problem ids.
+
+        Args:
+            ids (Optional[List[int]]): Keep only these ids (None keeps all).
+            start (Optional[int]): Keep ids >= start (None for no lower bound).
+            end (Optional[int]): Keep ids <= end (None for no upper bound).
+
+        Returns:
+            List[int]: The matching ids in file order.
+        """
+        wanted = set(ids) if ids is not None else None
+        return [
+            id for id in self.offsets
+            if (wanted is None or id in wanted)
+            and (start is None or id >= start)
+            and (end is None or id <= end)
+        ]
+
+    def iter_problems(self, ids: Optional[List[int]] = None, start: Optional[int] = None, end: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Lazily load the problems matching `select(ids, start, end)`, one at a time."""
+        for id in self.select(ids, start, end):
+            yield self[id]
@@ -1,28 +1,202 @@
-from typing import List
-from run_code import run_code_with_inputs
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+from checker import compare_output, iter_expected, normalize_expected
+from compile_cache import source_key
+from run_code import run_code_with_inputs, COMPILE_FLAGS
+from scheduler import PRIORITY_EXPLORE
+from testfiles import TestData, TestFile
+from tracing import span
+from verdict_cache import VerdictCache, test_digest
+
+# Never cached: verdicts that depend on machine load, and results of runs that never executed the program
+UNCACHED_STATUSES = ("TLE", "SKIPPED", "ERROR")
 
 class Evaluator:
-    def __init__(self, inputs: List[str], outputs: List[str]):
+    def __init__(self, inputs: List[TestData], outputs: List[TestData], fail_fast: bool = False, float_tolerance: Optional[float] = None,
+                 verdict_cache: Optional[VerdictCache] = None, timeout: int = 2, owner=None):
         self.test_num = len(inputs)
         self.inputs = inputs
         self.outputs = outputs
-        
-    def evaluate_code(self, code: str) -> float:
+        # CPU-time limit per test in seconds
+        self.timeout = timeout
+        # Identifies this problem in the shared execution scheduler
+        self.owner = owner
+        # Absolute/relative tolerance for numeric tokens, None for exact token comparison
+        self.float_tolerance = float_tolerance
+        # Expected outputs tokenized once here instead of re-stripped on every evaluation;
+        # outputs stored as files stay on disk and are compared through a memory map
+        self.expected = [
+            answer if isinstance(answer, TestFile) else normalize_expected(answer, float_tolerance)
+            for answer in outputs
+        ]
+        # Stop running tests once a candidate fails one of them
+        self.fail_fast = fail_fast
+
+        # Per-test history across evaluations of this problem, used to order tests in fail-fast mode;
+        # guarded by a lock since pipelined and parallel searches evaluate candidates concurrently
+        self.test_runs = [0] * self.test_num
+        self.test_failures = [0] * self.test_num
+        self._history_lock = threading.Lock()
+
+        # Persistent per-test verdicts; tests are identified by a digest of their contents,
+        # so verdicts recorded against older test data are never reused
+        self.verdict_cache = verdict_cache
+        if verdict_cache is not None:
+            self.test_hashes = [test_digest(input, output) for input, output in zip(inputs, outputs)]
+            self.settings = f"timeout={timeout};float_tolerance={float_tolerance}"
+
+    def test_order(self) -> List[int]:
+        """
+        Order the tests so that the ones most likely to reject a candidate run first.
+
+        Tests are sorted by historical failure rate (highest first), breaking ties by input size (smallest first).
+
+        Returns:
+            List[int]: Test indices in the order they should be run.
+        """
+        with self._history_lock:
+            runs, failures = list(self.test_runs), list(self.test_failures)
+
+        def priority(id: int):
+            failure_rate = failures[id] / runs[id] if runs[id] else 0.0
+            return (-failure_rate, len(self.inputs[id]), id)
+
+        return sorted(range(self.test_num), key=priority)
+
+    def stratified_order(self) -> List[int]:
+        """
+        Order the tests so that every prefix is a stratified sample of the suite.
+
+        Tests are stratified by input size: with the tests sorted by size, the i-th test taken sits at
+        position van_der_corput(i) of that list, so the first 2^k tests fall in 2^k different size quantiles.
+
+        Returns:
+            List[int]: Every test index, once.
+        """
+        by_size = sorted(range(self.test_num), key=lambda id: (len(self.inputs[id]), id))
+        order = []
+        taken = [False] * self.test_num
+        i = 0
+        while len(order) < self.test_num:
+            # Base-2 van der Corput sequence: 0, 1/2, 1/4, 3/4, 1/8, ...
+            fraction, denominator, n = 0.0, 1.0, i
+            while n:
+                denominator *= 2
+                fraction += (n & 1) / denominator
+                n >>= 1
+            position = int(fraction * self.test_num)
+            if not taken[position]:
+                taken[position] = True
+                order.append(by_size[position])
+            i += 1
+        return order
+
+    def evaluate_code(self, code: str, fail_fast: bool = None, priority: int = PRIORITY_EXPLORE,
+                      tests: Optional[Sequence[int]] = None) -> float:
 
         """
         Evaluate the provided C++11 code with multiple inputs and expected outputs.
 
+        Outputs are captured as bytes and compared token by token with the pre-normalized expected outputs
+        (numeric tokens within `float_tolerance` match when it is set).
+
+        In fail-fast mode tests are run in `test_order` and tests that have not started when the first failure
+        is seen are skipped. Skipped tests count as failed, so the returned score is a lower bound on the exact
+        score (the upper bound is recorded in the "evaluate" span) and is only 1.0 if every test passed.
+
+        With a verdict cache, tests already judged for the same (normalized) code are not run again, and the
+        verdicts of the tests that do run are recorded.
+
         Args:
             code (str): The C++11 code as a string.
-            inputs (List[str]): A list of inputs to provide to the executable.
-            outputs (List[str]): A list of expected outputs corresponding to the inputs.
+            fail_fast (bool): Overrides the evaluator's fail-fast setting for this call.
+            priority (int): Priority class in the shared execution scheduler (PRIORITY_VERIFY for final checks).
+            tests (Sequence[int]): Indices of the tests to run (default: all); the score is the accuracy on these tests.
 
         Returns:
             float: The accuracy of the code as a float between 0 and 1.
         """
-        results = run_code_with_inputs(code, self.inputs)
-        score = 0
-        for (output, answer) in zip(results, self.outputs):
-            if output["stdout"].strip() == answer.strip():
-                score += 1
-        return score / self.test_num
\ No newline at end of file
+        if fail_fast is None:
+            fail_fast = self.fail_fast
+        if tests is None:
+            tests = range(self.test_num)
+
+        with span("evaluate", tests=len(tests), fail_fast=fail_fast) as trace:
+            score, upper = self._evaluate(code, fail_fast, priority, tests, trace)
+            trace.set(score=score, upper=upper)
+        return score
+
+    def _evaluate(self, code: str, fail_fast: bool, priority: int, tests: Sequence[int], trace) -> Tuple[float, float]:
+        """Run and judge the tests; return the (lower, upper) bounds on the score, equal unless tests were skipped."""
+        def is_correct(result) -> bool:
+            expected = self.expected[result["id"]]
+            if isinstance(expected, TestFile):
+                with expected.mapped() as answer:
+                    return compare_output(result["stdout"], iter_expected(answer, self.float_tolerance), self.float_tolerance)
+            return compare_output(result["stdout"], expected, self.float_tolerance)
+
+        selected = set(tests)
+        if fail_fast:
+            order = [id for id in self.test_order() if id in selected]
+        else:
+            order = list(tests)
+
+        # Verdicts of this code recorded by earlier evaluations
+        cached: Dict[int, bool] = {}
+        if self.verdict_cache is not None:
+            code_hash = source_key(code, COMPILE_FLAGS)
+            found = self.verdict_cache.lookup(code_hash, [self.test_hashes[id] for id in order], self.settings)
+            cached = {id: found[self.test_hashes[id]][0] for id in order if self.test_hashes[id] in found}
+
+        pending = [id for id in order if id not in cached]
+        if fail_fast and not all(cached.values()):
+            # A cached failure already decides the outcome
+            pending = []
+        trace.set(cached=len(cached), pending=len(pending))
+
+        # Verdicts reached while the runs were in flight, so outputs are not compared twice
+        verdicts: Dict[int, bool] = {}
+
+        def failed(result) -> bool:
+            verdicts[result["id"]] = is_correct(result)
+            return not verdicts[result["id"]]
+
+        results = []
+        if pending:
+            if fail_fast:
+                results = run_code_with_inputs(code, self.inputs, timeout=self.timeout, order=pending,
+                                               should_stop=failed, priority=priority, binary=True,
+                                               owner=self.owner)
+            else:
+                results = run_code_with_inputs(code, self.inputs, timeout=self.timeout, order=pending, priority=priority, binary=True,
+                                               owner=self.owner)
+            # A compilation failure is reported for every input, including cached and unselected ones
+            results = [result for result in results if result["id"] in selected and result["id"] not in cached]
+
+        score = sum(cached.values())
+        skipped = len(order) - len(cached) - len(results)
+        judged = []
+        new_verdicts = []
+        with span("compare", tests=len(results)):
+            for result in results:
+                if result["status"] == "SKIPPED":
+                    skipped += 1
+                    continue
+                correct = verdicts[result["id"]] if result["id"] in verdicts else is_correct(result)
+                judged.append((result["id"], correct))
+                if correct:
+                    score += 1
+                if self.verdict_cache is not None and result["status"] not in UNCACHED_STATUSES:
+                    new_verdicts.append((self.test_hashes[result["id"]], correct, result))
+
+        with self._history_lock:
+            for id, correct in judged:
+                self.test_runs[id] += 1
+                if not correct:
+                    self.test_failures[id] += 1
+        if new_verdicts:
+            self.verdict_cache.store(code_hash, self.settings, new_verdicts)
+        trace.set(skipped=skipped)
+        if not order:
+            return 0.0, 0.0
+        return score / len(order), (score + skipped) / len(order)
@@ -0,0 +1,68 @@
+import math
+from typing import List
+from evaluator import Evaluator
+from scheduler import PRIORITY_VERIFY
+
+
+class PartialReward(float):
+    """A reward measured on a sample of the tests; `fraction` is the share of the suite it ran on."""
+    __slots__ = ("fraction",)
+
+    def __new__(cls, score: float, fraction: float):
+        reward = super().__new__(cls, score)
+        reward.fraction = fraction
+        return reward
+
+
+def fidelity(reward: float) -> float:
+    """Share of the test suite a reward was measured on (1.0 for a plain full-suite score)."""
+    return reward.fraction if isinstance(reward, PartialReward) else 1.0
+
+
+def lower_bound(reward: float) -> float:
+    """Lowest full-suite score a reward allows, counting the tests it was not measured on as failed."""
+    return reward * fidelity(reward)
+
+
+class MultiFidelityReward:
+    """
+    `getReward` that scores candidates on growing stratified samples of the tests, successive-halving style.
+
+    A candidate is first run on `sample_size` tests. While its accuracy on the tests run so far reaches
+    `promote`, it moves up to a rung `eta` times larger, up to the whole suite. Every rung extends the
+    previous one, so no test is run twice. A candidate that stops below the full suite gets a
+    `PartialReward`; since `promote` is at most 1.0, a partial reward is never 1.0.
+    """
+    def __init__(self, evaluator: Evaluator, sample_size: int, eta: int = 3, promote: float = 0.5):
+        if not 0.0 <= promote <= 1.0:
+            raise ValueError("Invalid promotion threshold, should be between 0 and 1")
+        if eta < 2:
+            raise ValueError("Invalid eta, should be at least 2")
+        self.evaluator = evaluator
+        self.promote = promote
+        self.order = evaluator.stratified_order()
+        # Number of tests in each rung; the last rung is the whole suite
+        self.rungs: List[int] = []
+        size = max(1, sample_size)
+        while size < evaluator.test_num:
+            self.rungs.append(size)
+            size = math.ceil(size * eta)
+        self.rungs.append(evaluator.test_num)
+
+    def __call__(self, code: str) -> float:
+        passed = 0
+        start = 0
+        for size in self.rungs:
+            tests = self.order[start:size]
+            passed += round(self.evaluator.evaluate_code(code, tests=tests) * len(tests))
+            start = size
+            score = passed / size if size else 0.0
+            if size == self.evaluator.test_num or score < self.promote:
+                break
+        if size == self.evaluator.test_num:
+            return score
+        return PartialReward(score, size / self.evaluator.test_num)
+
+    def verify(self, code: str) -> float:
+        """Score a candidate on the whole suite, e.g. one kept by its partial reward."""
+        return self.evaluator.evaluate_code(code, priority=PRIORITY_VERIFY)
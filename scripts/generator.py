@@ -1,4 +1,5 @@
 from utils import *
+from prompt_context import bound_thoughts, window_messages
 import re
 import random
 
@@ -191,9 +192,15 @@ cot_generate_prompt = """
 
 # Base class for code generation, which contains shared methods and attributes.
 class Generator:
-    def __init__(self, problem_description):
+    def __init__(self, problem_description, max_tokens: int = 8000, thought_tokens: int = 3000):
         self.problem_description = problem_description  # Problem description as input.
         self.history = []  # History of interactions with the generator.
+        self.max_tokens = max_tokens  # Token budget of the conversation sent with each call.
+        self.thought_tokens = thought_tokens  # Token budget of the previous thoughts quoted in a prompt.
+
+    # Messages sent for the next call: the full history, windowed to the token budget.
+    def _context(self) -> List[Dict[str, str]]:
+        return window_messages(self.history, self.max_tokens)
 
     # Abstract method for generating code; must be implemented in subclasses.
     def generate_code(self, feedback: str=None) -> str:
@@ -238,8 +245,8 @@ class Generator:
 
 # Class for generating code using the GPT-4 model.
 class GPT4Generator(Generator):
-    def __init__(self, problem_description):
-        super().__init__(problem_description)  # Initialize the base class.
+    def __init__(self, problem_description, **kwargs):
+        super().__init__(problem_description, **kwargs)  # Initialize the base class.
 
     # Method to generate code with optional feedback.
     def generate_code(self, feedback: str=None) -> str:
@@ -249,7 +256,7 @@ class GPT4Generator(Generator):
             prompt = init_prompt.format(problem_description=self.problem_description)
         message = {"role": "user", "content": prompt}
         self.history.append(message)  # Add the prompt to the history.
-        response = generate_response(messages=self.history)  # Generate a response.
+        response = generate_response(messages=self._context())  # Generate a response.
         self.history.append({"role": "assistant", "content": response})  # Add the response to the history.
         return self._extract_c_code(response)  # Extract C++11 code from the response.
     
@@ -258,7 +265,7 @@ class GPT4Generator(Generator):
         prompt = critic_prompt.format(error_description=feedback)
         message = {"role": "user", "content": prompt}
         self.history.append(message)
-        response = generate_response(messages=self.history)
+        response = generate_response(messages=self._context())
         self.history.append({"role": "assistant", "content": response})
         return response
     
@@ -281,8 +288,8 @@ class GPT4Generator(Generator):
 
 # Class for generating code using the GLM model.
 class GLMGenerator(Generator):
-    def __init__(self, problem_description):
-        super().__init__(problem_description)
+    def __init__(self, problem_description, **kwargs):
+        super().__init__(problem_description, **kwargs)
 
     # Similar methods as GPT4Generator, adjusted for GLM model usage.
     def generate_code(self, feedback: str=None) -> str:
@@ -292,7 +299,7 @@ class GLMGenerator(Generator):
             prompt = init_prompt.format(problem_description=self.problem_description)
         message = {"role": "user", "content": prompt}
         self.history.append(message)
-        response = generate_response(messages=self.history)
+        response = generate_response(messages=self._context())
         self.history.append({"role": "assistant", "content": response})
         return self._extract_c_code(response)
     
@@ -300,7 +307,7 @@ class GLMGenerator(Generator):
         prompt = critic_prompt.format(error_description=feedback)
         message = {"role": "user", "content": prompt}
         self.history.append(message)
-        response = generate_response(messages=self.history)
+        response = generate_response(messages=self._context())
         self.history.append({"role": "assistant", "content": response})
         return response
     
@@ -322,8 +329,8 @@ class GLMGenerator(Generator):
     
 # Class for generating code using the GLM model.
 class GLMGeneratorTree(Generator):
-    def __init__(self, problem_description):
-        super().__init__(problem_description)
+    def __init__(self, problem_description, **kwargs):
+        super().__init__(problem_description, **kwargs)
 
     # Similar methods as GPT4Generator, adjusted for GLM model usage.
     def generate_code(self, n: int = 1, feedback: str = None, policy = "append") -> List[str]:
@@ -340,8 +347,9 @@ class GLMGeneratorTree(Generator):
         message = {"role": "user", "content": prompt}
         rsp_list = generate_response(messages=[message], n=n)
         return [self._extract_c_code(response) for response in rsp_list]
-    def generate_thoughts(self, n : int = 1, feedback: list[str] = [], policy = "append") -> List[str]:
+    def generate_thoughts(self, n : int = 1, feedback: List[str] = None, policy = "append") -> List[str]:
         if feedback and len(feedback) > 0:
+            feedback = bound_thoughts(feedback, self.thought_tokens)
             if policy == "append":
                 prompt = cot_append_prompt.format(problem_description=self.problem_description,previous_thoughts="\n\n".join(feedback) )
             elif policy == "modify":
@@ -353,11 +361,9 @@ class GLMGeneratorTree(Generator):
         message = {"role": "user", "content": prompt}
         rsp_list = generate_response(messages=[message], n=n)
         return rsp_list
-    def generate_code_w_thoughts(self, thought:str = "", thoughts: list[str] = []):
-        if thoughts == None or len(thoughts) == 0:
-            thoughts = [thought]
-        else:
-            thoughts.append(thought)
+    def generate_code_w_thoughts(self, thought:str = "", thoughts: List[str] = None):
+        # Build a new chain: the caller's list is a node's state and must not change
+        thoughts = bound_thoughts(list(thoughts or []) + [thought], self.thought_tokens)
         prompt = cot_generate_prompt.format(problem_description=self.problem_description, previous_thoughts="\n\n".join(thoughts))
         message = {"role": "user", "content": prompt}
         response = generate_response(messages=[message])[0]
@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import threading
+from typing import Any, Dict
+
+
+def _atomic_dump(obj: Any, path: str) -> None:
+    """Write JSON to a temporary file and rename it over `path`."""
+    tmp_path = path + ".part"
+    with open(tmp_path, "w") as f:
+        json.dump(obj, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class ResultsJournal:
+    """
+    Append-only JSONL journal of finished problems.
+
+    Each solved problem is one line holding its code and log entry, so recording a
+    result costs one append regardless of how many came before. Appends are fsynced
+    in batches (every `sync_every` records or `sync_interval` seconds). On start the
+    journal is replayed to find the question ids already finished, and `compact`
+    writes the familiar `code_*.json`/`log_*.json` files from it.
+    """
+    def __init__(self, path: str, sync_every: int = 8, sync_interval: float = 30.0):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+
+        # question_id -> latest record, in journal order
+        self.records: Dict[int, Dict[str, Any]] = {}
+        self._load()
+
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8")
+        if self._file.tell() > 0:
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # Terminate a torn last line so the next record starts on its own line
+                    self._file.write("\n")
+        self._unsynced = 0
+        self._last_sync = time.time()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-append
+                    continue
+                self.records[record["question_id"]] = record
+
+    def import_json(self, code_path: str, log_path: str) -> None:
+        """Seed an empty journal from `code_*.json`/`log_*.json` written before journals existed."""
+        if self.records or not (os.path.isfile(code_path) and os.path.isfile(log_path)):
+            return
+        with open(code_path, "r") as f:
+            codes = {entry["question_id"]: entry for entry in json.load(f)}
+        with open(log_path, "r") as f:
+            logs = json.load(f)
+        for entry in logs:
+            record = dict(entry)
+            record["code_file"] = codes.get(entry["question_id"], {}).get("code_file", "")
+            self.append(record)
+        self.sync()
+
+    def done(self) -> set:
+        """Return the question ids already recorded."""
+        return set(self.records)
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """Record a finished problem; `record` must contain "question_id"."""
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.records[record["question_id"]] = record
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every or time.time() - self._last_sync >= self.sync_interval:
+                self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.time()
+
+    def sync(self) -> None:
+        with self._lock:
+            self._sync()
+
+    def compact(self, code_path: str, log_path: str) -> None:
+        """
+        Write the latest record of every problem into the code and log JSON files, ordered by question id.
+
+        Args:
+            code_path (str): Path of the code file ({"question_id", "code_file"} entries).
+            log_path (str): Path of the log file (every other field of the records).
+        """
+        with self._lock:
+            self._sync()
+            records = [self.records[id] for id in sorted(self.records)]
+        results = [{"question_id": record["question_id"], "code_file": record.get("code_file", "")} for record in records]
+        log = [{key: value for key, value in record.items() if key != "code_file"} for record in records]
+        _atomic_dump(results, code_path)
+        _atomic_dump(log, log_path)
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._sync()
+                self._file.close()
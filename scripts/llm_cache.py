@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+CACHE_MODES = ("off", "record", "replay")
+
+
+class ReplayMissError(LookupError):
+    """Raised in replay mode when a request has no (or not enough) recorded samples."""
+
+
+def request_key(model: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+    """Hash a chat-completion request: model, messages and sampling parameters."""
+    payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent SQLite cache of sampled LLM responses.
+
+    Every request key maps to an ordered list of samples. Within a process, repeated
+    identical requests consume that list through a per-key cursor, so a rerun sees the
+    same sequence of samples as the recorded run (and rollouts of one prompt still get
+    distinct samples). In "record" mode missing samples are drawn from the API and
+    stored at the indices the cursor reserved for them; in "replay" mode the network is never used and a miss raises
+    ReplayMissError. Least recently used keys are evicted past `max_bytes`.
+    """
+    def __init__(self, db_path: str = os.path.join("results", "llm_cache.sqlite"), mode: str = "record", max_bytes: int = 1024 * 1024 * 1024):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Invalid cache mode, should be one of {CACHE_MODES}")
+        self.db_path = db_path
+        self.mode = mode
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self._cursors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS samples (
+                    key TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    content TEXT NOT NULL,
+                    PRIMARY KEY (key, idx)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS requests (
+                    key TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+
+    def take(self, key: str, n: int) -> Tuple[int, List[Optional[str]]]:
+        """
+        Reserve the next `n` sample indices of `key` for the caller.
+
+        Returns:
+            Tuple[int, List[Optional[str]]]: The first reserved index, and the sample recorded at each
+                reserved index (None where none is recorded yet).
+        """
+        with self._lock, self._conn:
+            start = self._cursors.get(key, 0)
+            rows = self._conn.execute(
+                "SELECT idx, content FROM samples WHERE key = ? AND idx >= ? AND idx < ?",
+                (key, start, start + n)
+            ).fetchall()
+            self._cursors[key] = start + n
+            if rows:
+                self._conn.execute("UPDATE requests SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.hits += len(rows)
+            self.misses += n - len(rows)
+        samples: List[Optional[str]] = [None] * n
+        for idx, content in rows:
+            samples[idx - start] = content
+        return start, samples
+
+    def put(self, key: str, samples: Dict[int, str]) -> None:
+        """
+        Store newly drawn samples of `key` at the indices reserved for them by `take` and evict old keys if
+        the cache is too large. Indices another process has filled in the meantime are left as they are.
+        """
+        if not samples:
+            return
+        with self._lock, self._conn:
+            size = 0
+            for idx, content in samples.items():
+                inserted = self._conn.execute("INSERT OR IGNORE INTO samples VALUES (?, ?, ?)", (key, idx, content))
+                if inserted.rowcount:
+                    size += len(content.encode("utf-8"))
+            self._conn.execute(
+                "INSERT INTO requests VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE SET size = size + ?, last_used = ?",
+                (key, size, time.time(), size, time.time())
+            )
+            self._evict()
+
+    def _evict(self):
+        (total,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM requests").fetchone()
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM requests ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM samples WHERE key = ?", (key,))
+            self._conn.execute("DELETE FROM requests WHERE key = ?", (key,))
+            self._cursors.pop(key, None)
+            total -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"mode": self.mode, "hits": self.hits, "misses": self.misses}
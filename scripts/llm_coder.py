@@ -1,11 +1,18 @@
-import json, os
+import os, time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from tqdm import tqdm
-from typing import Any, List
-from mcts import MCTSTree
-from treeofthoughts import TreeofToughts
+from typing import Any, Dict, List, Tuple
 from evaluator import Evaluator
+from solver import METHODS, run_method
 from generator import Generator, GENERATOR_TYPE
-from utils import read_jsonl, parse_args
+from scheduler import get_scheduler
+from testfiles import load_tests
+from verdict_cache import get_verdict_cache
+from dataset import ProblemDataset
+from journal import ResultsJournal
+from checkpoint import SearchCheckpoint, install_signal_handlers, stop_requested
+from tracing import configure_tracing, current_problem, span
+from utils import parse_args, sampling_engine
 import yaml
 
 with open("config.yaml", "r") as file:
@@ -120,89 +127,151 @@ def solve_problem(problem_description: str, method: str = None, inputs: List[str
 
     return code
 
+def solve_test_case(test_case: Dict[str, Any], model_name: str, method_name: str, method_config: Dict[str, Any],
+                    eval_config: Dict[str, Any], pipeline_depth: int = 0, dedup: str = "tokens",
+                    context_config: Dict[str, Any] = None, parallel: int = 1,
+                    transpositions: bool = True, fidelity_config: Dict[str, Any] = None,
+                    checkpoint_config: Dict[str, Any] = None) -> Tuple[str, float, int, int]:
+    """
+    Search for a solution of one problem with its own generator, evaluator and tree.
+
+    With a `checkpoint_config` ({"dir", "interval", "warm_start"}), tree searches are snapshotted to
+    <dir>/<id>.json.gz and resume from that snapshot, or else from <warm_start>/<id>.json.gz.
+
+    Returns:
+        Tuple[str, float, int, int]: The selected code, its score, the revision and the budget used.
+    """
+    # Spans of this problem, including those in worker threads, carry its id
+    current_problem.set(test_case["id"])
+    try:
+        generator: Generator = GENERATOR_TYPE[model_name](test_case["description"], **(context_config or {}))
+    except KeyError:
+        raise ValueError(f"Model unavailable! Choose from: {list(GENERATOR_TYPE.keys())}")
+    
+    inputs, outputs = load_tests(test_case, "./data")
+    evaluator = Evaluator(inputs, outputs, fail_fast=eval_config.get("fail_fast", False),
+                          float_tolerance=eval_config.get("float_tolerance"),
+                          verdict_cache=get_verdict_cache() if eval_config.get("verdict_cache", False) else None,
+                          owner=test_case["id"])
+    checkpoint = None
+    if checkpoint_config:
+        snapshot = f"{test_case['id']}.json.gz"
+        warm_start = checkpoint_config.get("warm_start")
+        checkpoint = SearchCheckpoint(os.path.join(checkpoint_config["dir"], snapshot), checkpoint_config.get("interval", 60.0),
+                                      os.path.join(warm_start, snapshot) if warm_start else None)
+    
+    with span("solve", method=method_name) as trace:
+        code_file, score, revision, budget = run_method(generator, evaluator, method_name, method_config, pipeline_depth, dedup, parallel,
+                                                          transpositions, fidelity_config, checkpoint)
+        trace.set(score=score, budget=budget)
+    return code_file, score, revision, budget
+
 if __name__ == "__main__":
     args = parse_args()
     model_name = args.model_name
     method_name = args.method_name
     # iterations = args.iterations
     
-    if method_name in ["mcts", "vanilla","tot"]:
+    if method_name in METHODS:
         method_config = config["method"][method_name]
     else:
         raise ValueError(f"Method {method_name} not supported, choose from: mcts, vanilla")
+    eval_config = config.get("evaluation") or {}
+    # Start the process-wide execution scheduler shared by every Evaluator
+    get_scheduler(eval_config.get("slots"))
+    # Number of speculative generations kept in flight while candidates are evaluated
+    pipeline_depth = (config.get("pipeline") or {}).get("depth", 0)
+    # How candidate programs are canonicalized before evaluation ("off", "tokens" or "identifiers")
+    dedup = (config.get("search") or {}).get("dedup", "tokens")
+    # Number of MCTS leaves expanded concurrently per problem
+    parallel = (config.get("search") or {}).get("parallel", 1)
+    # Whether branches that derive the same state share one tree node
+    transpositions = (config.get("search") or {}).get("transpositions", True)
+    # Sampled-test scoring of tree candidates, with promotion to the whole suite
+    fidelity_config = config.get("fidelity") or {}
+    # Token budgets of the conversation and of the thought chains sent to the LLM
+    context_config = config.get("context") or {}
+    llm_config = dict(config.get("llm") or {})
+    if args.llm_cache:
+        llm_config["cache_mode"] = args.llm_cache
+    sampling_engine.configure(**llm_config)
+    # Phase timings are written as a Chrome trace when a path is given
+    configure_tracing(args.trace or (config.get("tracing") or {}).get("path"))
     
     config_str = "_".join([method_name] + [f"{key[0]}_{value}" for key, value in method_config.items()])
     result_path = os.path.join("./results", config_str)
     os.makedirs(result_path, exist_ok=True)
     code_path = os.path.join(result_path, f"code_{config_str}.json")
     log_path = os.path.join(result_path, f"log_{config_str}.json")
-    if os.path.isfile(code_path) and os.path.isfile(log_path):
-        with open(code_path, "r") as f:
-            results = json.load(f)
-        with open(log_path, "r") as f:
-            log = json.load(f)
-    else:
-        results = []
-        log = []
-        
-    data = read_jsonl("./data/data.jsonl")
-    
-    for test_case in tqdm(data, desc="Generating"):
-        # result = evaluate_problem(
-        #     problem_description=test_case["description"],
-        #     method=method_name,
-        #     public_tests=test_case["public_tests"],  # Directly pass the entire public_tests list
-        #     private_tests=private_tests,  # Assuming private_tests is available
-        #     time_limit=time_limit,
-        #     memory_limit=test_case["memory_limit_bytes"],  # Assuming memory limit is in bytes
-        #     iterations=iterations
-        # )
-        
-        # code_file = solve_problem(test_case["description"], None, test_case["inputs"], test_case["outputs"])
-        try:
-            generator: Generator = GENERATOR_TYPE[model_name](test_case["description"])
-        except KeyError:
-            raise ValueError(f"Model unavailable! Choose from: {list(GENERATOR_TYPE.keys())}")
-        
-        evaluator = Evaluator(test_case["inputs"], test_case["outputs"])
+    # Finished problems are appended to a journal; code/log JSON files are compacted from it
+    journal = ResultsJournal(os.path.join(result_path, f"journal_{config_str}.jsonl"))
+    journal.import_json(code_path, log_path)
+    # Unfinished searches resume from their snapshots; SIGUSR1 snapshots every running search
+    checkpoint_config = dict(config.get("checkpoint") or {}, dir=os.path.join(result_path, "checkpoints"), warm_start=args.warm_start)
+    install_signal_handlers()
         
-        if method_name == "mcts":
-            mcts = MCTSTree(generator.generate_code, evaluator.evaluate_code, max_w = method_config["max_w"], step = method_config["step"], budget = method_config["budget"], bp_policy=method_config["bp_policy"],derive_policy=method_config["derive_policy"])
-            code_file, score, revision, budget = mcts.search()
-        elif method_name == "vanilla":
-            best_score = 0
-            code_file = ""
-            for b in tqdm(range(method_config["budget"]), desc="Vanilla"):
-                code = generator.generate_code()[0]
-                score = evaluator.evaluate_code(code)
-                budget = b + 1
-                if score >= best_score:
-                    best_score = score
-                    code_file = code
-                if score == 1.0:
-                    code_file = code
-                    break
-            revision = 0
-            score = best_score
-        elif method_name == "tot":
-            tot = TreeofToughts(generator.generate_thoughts,evaluator.evaluate_code,generator.generate_code_w_thoughts, max_w = method_config["max_w"], step = method_config["step"], budget = method_config["budget"], bp_policy=method_config["bp_policy"], derive_policy=method_config["derive_policy"], rollout_num = method_config["rollout_num"])
-            code_file, score, revision, budget = tot.search()
-        else:
-            raise ValueError(f"Method {method_name} not supported, choose from: mcts, vanilla")
-        
-        results.append({
+    data = ProblemDataset("./data/data.jsonl")
+    finished = journal.done()
+    problem_ids = [id for id in data.select(args.ids, args.start, args.end) if id not in finished]
+    if finished:
+        print(f"Resuming: skipping {len(finished)} problems already in the journal")
+
+    def record(test_case, code_file, score, revision, budget, elapsed):
+        journal.append({
             "question_id": test_case["id"],
             "code_file": code_file,
-        })
-        log.append({
-            "question_id": test_case["id"],
             "score": score,
             "revision": revision,
             "budget": budget
         })
-        print(f"Test Case {test_case['id']}: {score} {revision} {budget}")
-        
-        with open(code_path, "w") as f:
-            json.dump(results, f, indent=4)
-        with open(log_path, "w") as f:
-            json.dump(log, f, indent=4)
+        print(f"Test Case {test_case['id']}: {score} {revision} {budget} ({elapsed:.1f}s)")
+
+    settings = dict(model_name=model_name, method_name=method_name, method_config=method_config,
+                    eval_config=eval_config, pipeline_depth=pipeline_depth, dedup=dedup,
+                    context_config=context_config, parallel=parallel, transpositions=transpositions,
+                    fidelity_config=fidelity_config, checkpoint_config=checkpoint_config)
+
+    try:
+        if args.workers <= 1:
+            for test_case in tqdm(data.iter_problems(problem_ids), desc="Generating", total=len(problem_ids)):
+                if stop_requested():
+                    raise KeyboardInterrupt
+                start_time = time.time()
+                record(test_case, *solve_test_case(test_case, **settings), time.time() - start_time)
+        else:
+            # Solve several problems at once; run slots and LLM calls are shared fairly between them
+            solved = 0
+            scores = []
+            with ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="problem") as executor:
+                def submit(test_case):
+                    start_time = time.time()
+                    return executor.submit(lambda: (*solve_test_case(test_case, **settings), time.time() - start_time))
+
+                problems = data.iter_problems(problem_ids)
+                future_to_case = {}
+                # Keep at most `workers` problems loaded at a time
+                for test_case in problems:
+                    future_to_case[submit(test_case)] = test_case
+                    if len(future_to_case) >= args.workers:
+                        break
+
+                with tqdm(total=len(problem_ids), desc="Generating") as progress:
+                    while future_to_case:
+                        done, _ = wait(future_to_case, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            test_case = future_to_case.pop(future)
+                            code_file, score, revision, budget, elapsed = future.result()
+                            record(test_case, code_file, score, revision, budget, elapsed)
+                            scores.append(score)
+                            solved += score == 1.0
+                            progress.update(1)
+                            progress.set_postfix(solved=solved, mean_score=f"{sum(scores) / len(scores):.2f}",
+                                                 running=sorted(case["id"] for case in future_to_case.values()))
+                            next_case = next(problems, None) if not stop_requested() else None
+                            if next_case is not None:
+                                future_to_case[submit(next_case)] = next_case
+    finally:
+        # Rewrite the code/log JSON files once from the journal
+        journal.compact(code_path, log_path)
+        journal.close()
+        configure_tracing(None)
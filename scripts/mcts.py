@@ -1,93 +1,194 @@
 import math
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from tqdm import tqdm
-from tree import Tree, TreeNode
+from tree import Tree, TreeNode, TranspositionTable
+from pipeline import Prefetcher
+from canonical import RewardMemo, code_key, unique_actions
+from fidelity import fidelity, lower_bound
+from tracing import bind
 
 class MCTSNode(TreeNode):
+    __slots__ = ("length_exceeded", "multiplicity", "action_counts", "virtual_loss", "pending", "sampling")
+
     def __init__(self, state = None, action = None, parent = None, score = 0, length_exceeded = False):
         super().__init__(state, action, parent, score)
         self.length_exceeded = length_exceeded
+        # Number of sampled actions this node stands for (1 + merged duplicates)
+        self.multiplicity = 1
+        # Sampled copies of every pending action, when actions are deduplicated
+        self.action_counts = None
+        # Parallel search: jobs in flight below this node, expansions being evaluated, and whether actions are being sampled
+        self.virtual_loss = 0
+        self.pending = 0
+        self.sampling = False
 
     def is_fully_expanded(self):
         """Check if all possible children have been expanded."""
         return self.actions is not None and len(self.actions) == 0
 
-    def expand(self, getAction, getReward, max_a, step, policy = "append"):
-        """Expand the node by creating a new child node for an unexplored action."""
+    def expand(self, getAction, getReward, max_a, step, policy = "append", key = None, table = None):
+        """
+        Expand the node by creating a new child node for an unexplored action.
+        With a canonicalization `key`, equivalent actions are merged into one child whose
+        multiplicity counts them, and only that child is evaluated. With a transposition
+        `table`, a state derived before is shared with the branches that reached it.
+
+        Returns:
+            The child, the action's reward and the number of sampled copies of the action.
+        """
         if self.actions is None:
-            self.actions = set(getAction(max_a, self.state, policy))
+            self.set_actions(getAction(max_a, self.state, policy), key)
         
         action = self.actions.pop()
-        reward = getReward(action)
+        try:
+            reward = getReward(action)
+        except BaseException:
+            # Keep the action untried, e.g. for a snapshot of an interrupted search
+            self.actions.append(action)
+            raise
+        child_node, copies = self.add_child(action, reward, step, policy, table)
+        
+        return child_node, reward, copies
+
+    def set_actions(self, actions, key = None):
+        """Store the sampled actions, merging equivalent ones when a canonicalization `key` is given."""
+        if key is None:
+            self.actions = list(dict.fromkeys(actions))
+        else:
+            self.action_counts = unique_actions(actions, key)
+            self.actions = list(self.action_counts)
+
+    def child_state(self, action, step, policy = "append"):
+        """The state reached by an action, and whether it is a whole program that cannot be extended."""
         if policy == "append":
             split_action = action.split("\n")
             if len(split_action) <= step * (self.depth + 1):
-                child_state = action
-                length_exceeded = True
-            else:
-                child_state = "\n".join(split_action[:step * (self.depth + 1)])
-                length_exceeded = False
+                return action, True
+            return "\n".join(split_action[:step * (self.depth + 1)]), False
         elif policy == "modify":
-            child_state = action
-            length_exceeded = False
-        child_node = MCTSNode(child_state, action, self, reward, length_exceeded)
-        self.children.append(child_node)
-        
-        return child_node, reward
-
-    def best_child(self, exploration_weight=1.0):
-        """Select the best child node using the UCB formula."""
-        return max(
-            [child for child in self.children if not child.length_exceeded],
-            key=lambda child: child.value / (child.visit + 1e-6) +
-                exploration_weight * math.sqrt(math.log(self.visit + 1) / (child.visit + 1e-6))
-        )
-        
-    def bp(self, reward, policy):
-        """Propagate the reward of a simulation up the tree."""
-        self.visit += 1
-        if policy == "max":
-            self.value = max(reward, self.value)
-        elif policy == "accumulate":
-            self.value += reward
+            return action, False
+
+    def add_child(self, action, reward, step, policy = "append", table = None):
+        """
+        Create the child reached by an evaluated action, or link the node of the same state from the transposition `table`.
+
+        Returns:
+            The child and the number of sampled copies of the action.
+        """
+        child_state, length_exceeded = self.child_state(action, step, policy)
+        copies = self.action_counts.pop(action) if self.action_counts is not None else 1
+        child_node = table.get(child_state, self.depth + 1) if table is not None else None
+        if child_node is None:
+            child_node = MCTSNode(child_state, action, self, reward, length_exceeded)
+            child_node.multiplicity = copies
+            self.children.append(child_node)
+            if table is not None:
+                table.add(child_node)
         else:
-            raise ValueError("Invalid BP policy, should be 'max' or 'accumulate'")
-        
-        if self.is_fully_expanded():
-            length_exceeded = True
-            for child in self.children:
-                if not child.length_exceeded:
-                    length_exceeded = False
-                    break
-            self.length_exceeded = length_exceeded
+            child_node.link(self)
+            child_node.multiplicity += copies
+            if (fidelity(reward), reward) > (child_node.fidelity, child_node.score):
+                child_node.action, child_node.score, child_node.fidelity = action, reward, fidelity(reward)
+
+        return child_node, copies
+
+    def best_child(self, exploration_weight=1.0, skip_busy=False):
+        """
+        Select the best child node using the UCB formula.
+        Jobs in flight count as visits that returned no reward (virtual loss). With `skip_busy`,
+        children whose actions are being sampled are passed over; None is returned if no child qualifies.
+        """
+        log_visit = math.log(self.visit + self.virtual_loss + 1)
+        best, best_ucb = None, float("-inf")
+        for child in self.children:
+            if child.length_exceeded or (skip_busy and child.sampling):
+                continue
+            visit = child.visit + child.virtual_loss + 1e-6
+            ucb = child.value / visit + exploration_weight * math.sqrt(log_visit / visit)
+            if ucb > best_ucb:
+                best, best_ucb = child, ucb
+        if best is None and not skip_busy:
+            raise ValueError("No expandable child")
+        return best
         
-        if self.parent:
-            self.parent.bp(reward, policy)
+    def bp(self, reward, policy, visits = 1):
+        """
+        Propagate the reward of a simulation (counted `visits` times) to every ancestor once, iteratively.
+        A partial reward counts as whole visits worth its full-suite lower bound.
+        """
+        if policy not in ("max", "accumulate"):
+            raise ValueError("Invalid BP policy, should be 'max' or 'accumulate'")
+        value = lower_bound(reward)
+        for node in self.lineage():
+            node.visit += visits
+            if policy == "max":
+                node.value = max(value, node.value)
+            else:
+                node.value += value * visits
+            
+            if node.is_fully_expanded() and node.pending == 0:
+                node.length_exceeded = all(child.length_exceeded for child in node.children)
 
 
 class MCTSTree(Tree):
-    def __init__(self, getAction, getReward, max_w = 3, step = 5, budget = 50, bp_policy="max", derive_policy = "append"):
+    def __init__(self, getAction, getReward, max_w = 3, step = 5, budget = 50, bp_policy="max", derive_policy = "append", pipeline_depth = 0, dedup = "tokens", parallel = 1, transpositions = True, checkpoint = None):
         super().__init__(getAction, getReward, None, max_w, step, budget)
         self.root = MCTSNode()
         self.bp_policy = bp_policy
         self.derive_policy = derive_policy
+        # Number of speculative LLM calls/evaluations kept in flight (0 disables pipelining)
+        self.pipeline_depth = pipeline_depth
+        # Number of leaves expanded at once (1 runs the sequential search)
+        self.parallel = parallel
+        # Canonicalization of candidate programs ("off", "tokens" or "identifiers")
+        self.action_key = code_key(dedup)
+        if self.action_key is not None:
+            self.getReward = RewardMemo(self.getReward, self.action_key)
+        # Nodes shared by branches that derive the same (canonical) program state
+        self.table = TranspositionTable(self.action_key) if transpositions else None
+        self.checkpoint = checkpoint
         if self.bp_policy not in ["max", "accumulate"]:
             raise ValueError("Invalid BP policy, should be 'max' or 'accumulate'")
         if self.derive_policy not in ["append", "modify"]:
             raise ValueError("Invalid derive_policy, should be 'append' or 'modify'")
     def search(self):
-        """Perform MCTS search for a given number of iterations."""
-        for b in tqdm(range(self.budget, 0, -1), desc="MCTS searching"):
-            node: MCTSNode = self.select()
-            max_a = min(b, self.max_w)
-            node, reward = node.expand(self.getAction, self.getReward, max_a, self.step, self.derive_policy)
-            if reward == 1.0:
-                # self.print_tree()
-                return node.action, 1.0, node.depth - 1, self.budget - b + 1
-            node.bp(reward, self.bp_policy)
-            if self.root.length_exceeded:
-                code, score, revision = self.final_select()
-                # self.print_tree()
-                return code, score, revision, self.budget - b + 1
+        """Perform MCTS search for a given number of iterations, resuming from a snapshot of the checkpoint if there is one."""
+        if self.parallel > 1:
+            return self.run_checkpointed(self.search_parallel)
+        return self.run_checkpointed(self.search_sequential)
+
+    def search_sequential(self):
+        """Expand one leaf at a time, optionally pipelining LLM calls and evaluations."""
+        if self.pipeline_depth > 0:
+            prefetcher = Prefetcher(self.getAction, self.getReward, self.pipeline_depth, self.action_key)
+            getAction, getReward = prefetcher.getAction, prefetcher.getReward
+        else:
+            prefetcher = None
+            getAction, getReward = self.getAction, self.getReward
+
+        try:
+            for b in tqdm(range(self.budget - self.spent, 0, -1), desc="MCTS searching"):
+                node: MCTSNode = self.select()
+                max_a = min(b, self.max_w)
+                node, reward, visits = node.expand(getAction, getReward, max_a, self.step, self.derive_policy, self.action_key, self.table)
+                self.spent = self.budget - b + 1
+                self.track_best(node)
+                if reward == 1.0:
+                    # self.print_tree()
+                    return node.action, 1.0, node.depth - 1, self.budget - b + 1
+                # Merged duplicates count as simulations with the same reward
+                node.bp(reward, self.bp_policy, visits)
+                if self.root.length_exceeded:
+                    code, score, revision = self.final_select()
+                    # self.print_tree()
+                    return code, score, revision, self.budget - b + 1
+                if prefetcher is not None and not node.length_exceeded and node.actions is None and b > 1:
+                    # Ask for the new child's actions while its siblings are evaluated
+                    prefetcher.prefetch_actions(min(b - 1, self.max_w), node.state, self.derive_policy)
+                self.checkpoint_step()
+        finally:
+            if prefetcher is not None:
+                prefetcher.shutdown()
             
         # self.print_tree()
             
@@ -95,6 +196,95 @@ class MCTSTree(Tree):
 
         return code, score, revision, self.budget
 
+    def search_parallel(self):
+        """
+        Perform MCTS search with up to `parallel` expansions in flight.
+
+        The calling thread alone selects nodes, creates children and backpropagates, so the tree statistics
+        are never updated concurrently; worker threads only sample actions and evaluate candidates. Every job
+        puts a virtual loss on its path until it completes, which steers the next selections to other branches.
+        As in `search`, `budget` bounds the number of evaluations and the search stops at the first reward of 1.0.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.parallel, thread_name_prefix="mcts")
+        # future -> (node, action being evaluated, or None while the node's actions are sampled)
+        jobs = self.in_flight = {}
+        launched = evaluated = self.spent
+        try:
+            with tqdm(total=self.budget, initial=self.spent, desc="MCTS searching") as progress:
+                while True:
+                    while len(jobs) < self.parallel and launched < self.budget:
+                        node: MCTSNode = self.select_parallel()
+                        if node is None:
+                            break
+                        self._add_virtual_loss(node, 1)
+                        if node.actions is None:
+                            node.sampling = True
+                            max_a = min(self.budget - launched, self.max_w)
+                            jobs[executor.submit(bind(self.getAction), max_a, node.state, self.derive_policy)] = (node, None)
+                        else:
+                            action = node.actions.pop()
+                            node.pending += 1
+                            jobs[executor.submit(bind(self.getReward), action)] = (node, action)
+                            launched += 1
+                    if not jobs:
+                        break
+
+                    done, _ = wait(jobs, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        node, action = jobs.pop(future)
+                        self._add_virtual_loss(node, -1)
+                        if action is None:
+                            node.sampling = False
+                            node.set_actions(future.result(), self.action_key)
+                            if not node.actions:
+                                # Nothing was sampled: treat the node as a dead end
+                                node.length_exceeded = True
+                            continue
+
+                        node.pending -= 1
+                        reward = future.result()
+                        evaluated += 1
+                        self.spent = evaluated
+                        progress.update(1)
+                        child, visits = node.add_child(action, reward, self.step, self.derive_policy, self.table)
+                        self.track_best(child)
+                        if reward == 1.0:
+                            return child.action, 1.0, child.depth - 1, evaluated
+                        child.bp(reward, self.bp_policy, visits)
+                        if self.root.length_exceeded:
+                            code, score, revision = self.final_select()
+                            return code, score, revision, evaluated
+                    self.checkpoint_step()
+        finally:
+            for future in jobs:
+                future.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        code, score, revision = self.final_select()
+
+        return code, score, revision, evaluated
+
+    def _add_virtual_loss(self, node: MCTSNode, amount: int):
+        for ancestor in node.lineage():
+            ancestor.virtual_loss += amount
+
+    def select_parallel(self):
+        """
+        Select a node to expand, skipping nodes whose actions are being sampled.
+
+        Returns None when every candidate is busy, i.e. nothing can be started until a job completes.
+        """
+        node = self.root
+        if node.sampling:
+            return None
+
+        while node.is_fully_expanded():
+            node = node.best_child(skip_busy=True)
+            if node is None:
+                return None
+
+        return node
+
     def select(self):
         """Select a node to expand based on the UCT formula."""
         node = self.root
@@ -105,18 +295,6 @@ class MCTSTree(Tree):
         return node
     
     def final_select(self):
-        """Traverse the entire tree and select the node with the highest score."""
-        def traverse(node: MCTSNode):
-            """Recursively traverse the tree to find the node with the highest score."""
-            best_node = node
-            for child in node.children:
-                candidate: MCTSNode = traverse(child)
-                if candidate.score > best_node.score:
-                    best_node = candidate
-                elif candidate.score == best_node.score and candidate.depth > best_node.score:
-                    best_node = candidate
-            return best_node
-
-        # Start traversal from the root and return the action of the best node
-        best_node = traverse(self.root)
+        """Return the node with the highest full-fidelity score (the deepest one among equals), tracked as nodes were added."""
+        best_node = self.verified_best(lambda node: node.action)
         return best_node.action, best_node.score, best_node.depth - 1
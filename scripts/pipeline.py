@@ -0,0 +1,129 @@
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from tqdm import tqdm
+from canonical import unique_actions
+from checkpoint import stop_requested
+from tracing import bind
+
+
+def pipelined_vanilla(generate: Callable[[], str], evaluate: Callable[[str], float], budget: int, depth: int = 4) -> Tuple[str, float, int, int]:
+    """
+    Vanilla sampling with generation and evaluation overlapped.
+
+    Up to `depth` generations are kept in flight while earlier candidates are compiled and run.
+    Candidates are evaluated in the order they were requested, so the result does not depend on
+    which LLM call returns first. No more than `budget` candidates are generated; once a candidate
+    scores 1.0, queued generations are cancelled and running ones are waited for before returning.
+
+    Args:
+        generate (Callable[[], str]): Draws one candidate program.
+        evaluate (Callable[[str], float]): Scores a candidate between 0 and 1.
+        budget (int): Maximum number of candidates.
+        depth (int): Number of generations kept in flight.
+
+    Returns:
+        Tuple[str, float, int, int]: The best code, its score, the revision (always 0) and the number of candidates evaluated.
+    """
+    best_score = 0
+    code_file = ""
+    evaluated = 0
+    executor = ThreadPoolExecutor(max_workers=max(1, depth), thread_name_prefix="generate")
+    in_flight = deque()
+    submitted = 0
+    try:
+        while submitted < budget and len(in_flight) < depth:
+            in_flight.append(executor.submit(bind(generate)))
+            submitted += 1
+
+        with tqdm(total=budget, desc="Vanilla") as progress:
+            while in_flight:
+                code = in_flight.popleft().result()
+                if stop_requested():
+                    raise KeyboardInterrupt
+                # Keep the generator busy while this candidate is evaluated
+                if submitted < budget:
+                    in_flight.append(executor.submit(bind(generate)))
+                    submitted += 1
+
+                score = evaluate(code)
+                evaluated += 1
+                progress.update(1)
+                if score >= best_score:
+                    best_score = score
+                    code_file = code
+                if score == 1.0:
+                    return code, 1.0, 0, evaluated
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    return code_file, best_score, 0, evaluated
+
+
+class Prefetcher:
+    """
+    Speculative look-ahead for tree search.
+
+    Wraps the tree's `getAction`/`getReward` so that:
+      - as soon as a node's actions are sampled, all of them are submitted for evaluation;
+      - as soon as a child is created, its own actions are requested from the LLM.
+    The tree then consumes these futures instead of calling the functions directly, so LLM
+    latency and compile/run time overlap. `cancel` drops everything still outstanding.
+    With a canonicalization `key`, only one action of each group of equivalent actions
+    is evaluated, matching the children the tree creates.
+    """
+    def __init__(self, getAction: Callable, getReward: Callable, depth: int = 4, key: Optional[Callable[[str], str]] = None):
+        self._getAction = getAction
+        self._getReward = getReward
+        self.depth = depth
+        self.key = key
+        self.generate_executor = ThreadPoolExecutor(max_workers=max(1, depth), thread_name_prefix="generate")
+        self.evaluate_executor = ThreadPoolExecutor(max_workers=max(1, depth), thread_name_prefix="evaluate")
+
+        self._lock = threading.Lock()
+        self._actions: Dict[Tuple, Future] = {}
+        self._rewards: Dict[str, Future] = {}
+
+    def prefetch_actions(self, max_a: int, state, policy) -> None:
+        """Start sampling the actions of a node that is likely to be expanded later."""
+        key = (state, policy)
+        with self._lock:
+            outstanding = sum(not future.done() for future in self._actions.values())
+            if key in self._actions or outstanding >= self.depth:
+                return
+            self._actions[key] = self.generate_executor.submit(bind(self._getAction), max_a, state, policy)
+
+    def getAction(self, max_a: int, state, policy) -> List[str]:
+        """Drop-in replacement for getAction that reuses a prefetched sample and starts evaluating it."""
+        with self._lock:
+            future = self._actions.pop((state, policy), None)
+        actions = future.result() if future is not None and not future.cancelled() else self._getAction(max_a, state, policy)
+        to_evaluate = actions if self.key is None else list(unique_actions(actions, self.key))
+        with self._lock:
+            for action in to_evaluate:
+                if action not in self._rewards:
+                    self._rewards[action] = self.evaluate_executor.submit(bind(self._getReward), action)
+        return actions
+
+    def getReward(self, action) -> float:
+        """Drop-in replacement for getReward that waits for the speculative evaluation if there is one."""
+        with self._lock:
+            future = self._rewards.pop(action, None)
+        if future is not None and not future.cancelled():
+            return future.result()
+        return self._getReward(action)
+
+    def cancel(self) -> None:
+        """Cancel all speculative work that has not started."""
+        with self._lock:
+            for future in list(self._actions.values()) + list(self._rewards.values()):
+                future.cancel()
+            self._actions.clear()
+            self._rewards.clear()
+
+    def shutdown(self) -> None:
+        """Cancel speculative work and wait for evaluations already running; LLM calls under way are dropped."""
+        self.cancel()
+        self.generate_executor.shutdown(wait=False, cancel_futures=True)
+        self.evaluate_executor.shutdown(wait=True, cancel_futures=True)
@@ -1,16 +1,24 @@
 import os
 import json
+import shutil
+import argparse
 
-def extract_contents_to_jsonl(folder_path, output_file):
+def extract_contents_to_jsonl(folder_path, output_file, inline=False):
     """
     Traverse subdirectories in the given folder path, extract .md and data files, 
     and save the combined results in a JSONL file.
 
+    By default the tests are kept as files: they are copied to `tests/<id>/` next to the output
+    file and each entry only records their names. With `inline`, the contents of every .in/.out
+    file are embedded in the JSONL file instead.
+
     Args:
         folder_path (str): Path to the main folder containing subdirectories.
         output_file (str): Path to the output JSONL file.
+        inline (bool): Embed the test contents instead of referencing the files.
     """
     data_entries = []
+    output_dir = os.path.dirname(output_file)
     
     subdirs = sorted([d for d in os.listdir(folder_path)], key=lambda x: int(x.split('_')[0]))
 
@@ -40,6 +48,10 @@ def extract_contents_to_jsonl(folder_path, output_file):
                     
                     in_content = []
                     out_content = []
+                    problem_id = int(subdir.split('_', 1)[0])
+                    tests_dir = os.path.join("tests", str(problem_id))
+                    if not inline:
+                        os.makedirs(os.path.join(output_dir, tests_dir), exist_ok=True)
 
                     for in_file, out_file in zip(in_files, out_files):
                         assert in_file.replace(".in", ".out") == out_file
@@ -47,21 +59,31 @@ def extract_contents_to_jsonl(folder_path, output_file):
                         in_file_path = os.path.join(data_dir_path, in_file)
                         out_file_path = os.path.join(data_dir_path, out_file)
 
-                        # Read the content of .in and .out files
-                        with open(in_file_path, "r", encoding="utf-8") as in_f:
-                            in_content.append(in_f.read())
-                        with open(out_file_path, "r", encoding="utf-8") as out_f:
-                            out_content.append(out_f.read())
+                        if inline:
+                            # Read the content of .in and .out files
+                            with open(in_file_path, "r", encoding="utf-8") as in_f:
+                                in_content.append(in_f.read())
+                            with open(out_file_path, "r", encoding="utf-8") as out_f:
+                                out_content.append(out_f.read())
+                        else:
+                            # Copy the .in and .out files and keep only their names
+                            shutil.copyfile(in_file_path, os.path.join(output_dir, tests_dir, in_file))
+                            shutil.copyfile(out_file_path, os.path.join(output_dir, tests_dir, out_file))
+                            in_content.append(in_file)
+                            out_content.append(out_file)
 
                     # Append a new entry to the list
                     assert len(in_content) == len(out_content)
-                    data_entries.append({
-                        "id": int(subdir.split('_', 1)[0]),
+                    entry = {
+                        "id": problem_id,
                         "name": subdir.split('_', 1)[1],
                         "description": md_content,
-                        "inputs": in_content,
-                        "outputs": out_content,
-                    })
+                    }
+                    if inline:
+                        entry.update({"inputs": in_content, "outputs": out_content})
+                    else:
+                        entry.update({"tests_dir": tests_dir, "input_files": in_content, "output_files": out_content})
+                    data_entries.append(entry)
                 except Exception as e:
                     print(f"Error processing {subdir}: {e}")
 
@@ -74,6 +96,10 @@ def extract_contents_to_jsonl(folder_path, output_file):
 
 
 # Example usage
+parser = argparse.ArgumentParser(description="Build data/data.jsonl from raw_data")
+parser.add_argument('--inline', action='store_true', help='Embed test contents in data.jsonl instead of referencing files')
+args = parser.parse_args()
+
 folder_path = "./raw_data"  # Replace with the path to your main folder
 output_file = "./data/data.jsonl"          # Replace with your desired output file name
-extract_contents_to_jsonl(folder_path, output_file)
+extract_contents_to_jsonl(folder_path, output_file, inline=args.inline)
@@ -0,0 +1,77 @@
+from typing import Dict, List
+from canonical import text_key
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Roughly estimate the number of tokens of `text` without a tokenizer.
+
+    ASCII text averages about four characters per token, while CJK characters are about one token each.
+    """
+    text = text or ""
+    # Every non-ASCII character takes 2-4 bytes in UTF-8; CJK (the common case here) takes 3
+    non_ascii = (len(text.encode("utf-8")) - len(text)) // 2
+    return (len(text) - non_ascii) // 4 + non_ascii + 1
+
+
+def window_messages(messages: List[Dict[str, str]], max_tokens: int) -> List[Dict[str, str]]:
+    """
+    Fit a conversation into a token budget.
+
+    The first exchange (which states the problem) and the latest messages are kept, and the turns
+    in between are replaced by a note at the start of the first kept message. The last message is
+    always sent, even if it alone exceeds the budget.
+
+    Args:
+        messages (List[Dict[str, str]]): The full conversation, alternating user and assistant messages.
+        max_tokens (int): Token budget of the prompt.
+
+    Returns:
+        List[Dict[str, str]]: The messages to send.
+    """
+    sizes = [estimate_tokens(message["content"]) for message in messages]
+    if sum(sizes) <= max_tokens or len(messages) <= 3:
+        return list(messages)
+
+    head = 2
+    budget = max_tokens - sum(sizes[:head])
+    start = len(messages) - 1
+    budget -= sizes[start]
+    while start - 1 >= head and sizes[start - 1] <= budget:
+        start -= 1
+        budget -= sizes[start]
+    # Resume on a user turn so roles keep alternating
+    if messages[start]["role"] != "user" and start + 1 < len(messages):
+        start += 1
+
+    omitted = start - head
+    if omitted <= 0:
+        return list(messages)
+    first = dict(messages[start])
+    first["content"] = f"({omitted} earlier messages omitted)\n" + first["content"]
+    return messages[:head] + [first] + messages[start + 1:]
+
+
+def bound_thoughts(thoughts: List[str], max_tokens: int) -> List[str]:
+    """
+    Deduplicate a chain of thoughts and keep the most recent ones that fit in `max_tokens`.
+
+    Thoughts equal up to whitespace are kept once, at their first position. The latest thought is always kept.
+    """
+    seen = set()
+    unique = []
+    for thought in thoughts:
+        key = text_key(thought)
+        if key not in seen:
+            seen.add(key)
+            unique.append(thought)
+
+    kept = []
+    budget = max_tokens
+    for thought in reversed(unique):
+        size = estimate_tokens(thought)
+        if kept and size > budget:
+            break
+        kept.append(thought)
+        budget -= size
+    return kept[::-1]
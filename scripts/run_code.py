@@ -1,23 +1,149 @@
 import os
+import sys
+import math
+import shutil
+import signal
 import subprocess
-import tempfile
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Dict
+from collections import Counter
+from concurrent.futures import as_completed
+from typing import Callable, List, Dict, Optional, Tuple
+from compile_cache import get_compile_cache
+from compile_server import get_compile_server
+from scheduler import get_scheduler, PRIORITY_EXPLORE
+from testfiles import TestData, TestFile
+from tracing import bind, span
+from workspace import get_workspace_pool
 
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; runs fall back to a plain wall-clock timeout
+    resource = None
 
-def run_single_input(exe_file_path: str, id: int, input_data: str, timeout: int) -> Dict[str, str]:
+# Flags passed to g++ for every candidate; part of the compile cache key
+COMPILE_FLAGS = ["-std=c++11"]
+
+# Default per-run limits
+MEMORY_LIMIT = 1024 * 1024 * 1024      # Address space of a candidate in bytes
+OUTPUT_FILE_LIMIT = 64 * 1024 * 1024   # Largest file a candidate may write in bytes
+MAX_PROCESSES = None                   # RLIMIT_NPROC is per user, so it is only set on request
+# Wall-clock limit as a multiple of the CPU-time limit. A candidate that sleeps or blocks (e.g. on a read)
+# uses no CPU time, so it is only stopped by this limit and passes as OK if it ends within 2x the timeout
+WALL_TIME_FACTOR = 2
+STDOUT_LIMIT = 16 * 1024 * 1024        # Captured stdout in bytes; a run printing more is killed
+STDERR_LIMIT = 64 * 1024               # Captured stderr in bytes; the rest is discarded
+READ_CHUNK = 64 * 1024
+
+
+# util-linux prlimit sets the limits and executes the candidate; elsewhere the shell's ulimit does
+PRLIMIT = shutil.which("prlimit")
+
+
+def _limited_command(exe_file_path: str, cpu_time: int, memory_limit: Optional[int], output_limit: Optional[int],
+                     max_processes: Optional[int]) -> List[str]:
+    """
+    Build a command that applies the resource limits and then executes the candidate in the same process.
+
+    The limits are set by the exec'd helper rather than by a `preexec_fn`, which is unsafe to run in the
+    forked child of a multi-threaded process.
+    """
+    # Soft limit delivers SIGXCPU, the hard limit one second later kills for sure
+    if PRLIMIT:
+        command = [PRLIMIT, f"--cpu={cpu_time}:{cpu_time + 1}"]
+        if memory_limit:
+            command.append(f"--as={memory_limit}")
+        if output_limit:
+            command.append(f"--fsize={output_limit}")
+        if max_processes:
+            command.append(f"--nproc={max_processes}")
+        return command + ["--", exe_file_path]
+
+    # ulimit takes the address space in kilobytes and file sizes in 512-byte blocks
+    limits = [f"ulimit -t {cpu_time + 1}", f"ulimit -S -t {cpu_time}"]
+    if memory_limit:
+        limits.append(f"ulimit -v {memory_limit // 1024}")
+    if output_limit:
+        limits.append(f"ulimit -f {output_limit // 512}")
+    if max_processes:
+        limits.append(f"ulimit -u {max_processes}")
+    return ["/bin/sh", "-c", " && ".join(limits) + ' && exec "$0"', exe_file_path]
+
+
+def _kill_group(pid: int):
+    """Kill the candidate together with every process it spawned."""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _drain(stream, chunks: List[bytes], limit: int, on_overflow: Optional[Callable[[], None]] = None):
+    """
+    Read a pipe into `chunks`, keeping at most `limit` bytes.
+
+    If `on_overflow` is given it is called as soon as the limit is exceeded and reading stops;
+    otherwise the excess is read and discarded so the writer never blocks.
+    """
+    size = 0
+    while True:
+        chunk = stream.read1(READ_CHUNK)
+        if not chunk:
+            break
+        if size + len(chunk) > limit:
+            chunks.append(chunk[:limit - size])
+            size = limit
+            if on_overflow is not None:
+                on_overflow()
+                break
+            continue
+        chunks.append(chunk)
+        size += len(chunk)
+    stream.close()
+
+
+def _feed(stream, data: bytes):
+    try:
+        stream.write(data)
+    except (BrokenPipeError, OSError):
+        # The candidate exited (or closed stdin) without reading all of its input
+        pass
+    finally:
+        try:
+            stream.close()
+        except (BrokenPipeError, OSError):
+            pass
+
+
+def run_single_input(exe_file_path: str, id: int, input_data: TestData, timeout: int, memory_limit: Optional[int] = MEMORY_LIMIT,
+                     output_limit: Optional[int] = OUTPUT_FILE_LIMIT, max_processes: Optional[int] = MAX_PROCESSES,
+                     binary: bool = False, pass_fds: Tuple[int, ...] = ()) -> Dict[str, str]:
     """
     Run the compiled executable with a single input.
 
+    On POSIX the candidate runs in its own process group under CPU-time, address-space, output-file-size and
+    (optionally) process-count limits. The group is killed on timeout, and the verdict is derived from the
+    `wait4` resource usage of the candidate rather than from the wall clock alone.
+
     Args:
         exe_file_path (str): Path to the compiled executable.
         id (int): The ID of the input.
-        input_data (str): The input to provide to the executable.
-        timeout (int): Maximum execution time in seconds.
+        input_data (TestData): The input to provide to the executable, as a string or a TestFile that is
+            opened and passed directly as stdin.
+        timeout (int): Maximum CPU time in seconds; the wall-clock limit is WALL_TIME_FACTOR times larger, so a
+            candidate that waits rather than computes passes if it ends within that.
+        memory_limit (Optional[int]): Address-space limit in bytes (None for no limit).
+        output_limit (Optional[int]): Maximum size in bytes of any file the candidate writes (None for no limit).
+        max_processes (Optional[int]): RLIMIT_NPROC for the candidate (None for no limit).
+        binary (bool): Return stdout as raw bytes instead of a stripped string. Either way, stdout is capped at
+            STDOUT_LIMIT bytes and a candidate printing more is killed with status "OLE".
+        pass_fds (Tuple[int, ...]): File descriptors the child inherits, e.g. the memfd holding the executable.
 
     Returns:
-        Dict[str, str]: A dictionary containing "stdout", "stderr", "error", and "time_elapsed".
+        Dict[str, str]: A dictionary containing "stdout", "stderr", "error", "status" (one of "OK", "TLE", "MLE",
+            "OLE", "RE", or "ERROR" when the harness failed to run the executable), "time_elapsed", "cpu_time"
+            (seconds) and "peak_rss" (bytes).
     """
     start_time = time.time()
     result = {
@@ -25,113 +151,300 @@ def run_single_input(exe_file_path: str, id: int, input_data: str, timeout: int)
         "stdout": "",
         "stderr": "",
         "error": "",
-        "time_elapsed": 0
+        "status": "OK",
+        "time_elapsed": 0,
+        "cpu_time": 0,
+        "peak_rss": 0
     }
+    with span("run", test=id) as trace:
+        if resource is None:
+            _run_single_input_portable(exe_file_path, result, input_data, timeout, start_time, binary, pass_fds)
+        else:
+            _run_single_input_posix(exe_file_path, result, input_data, timeout, start_time, memory_limit, output_limit,
+                                    max_processes, binary, pass_fds)
+        trace.set(status=result["status"], cpu_time=result["cpu_time"], peak_rss=result["peak_rss"])
+    return result
+
+
+def _run_single_input_posix(exe_file_path: str, result: Dict[str, str], input_data: TestData, timeout: int, start_time: float,
+                            memory_limit: Optional[int], output_limit: Optional[int], max_processes: Optional[int],
+                            binary: bool = False, pass_fds: Tuple[int, ...] = ()) -> Dict[str, str]:
+    """Run under rlimits in a separate process group and judge the run from its `wait4` resource usage."""
+    wall_timeout = timeout * WALL_TIME_FACTOR
+    timed_out = threading.Event()
+    overflowed = threading.Event()
+    stdin_file = None
     try:
+        if isinstance(input_data, TestFile):
+            stdin_file = input_data.open()
         process = subprocess.Popen(
-            [exe_file_path],
-            stdin=subprocess.PIPE,
+            _limited_command(exe_file_path, math.ceil(timeout), memory_limit, output_limit, max_processes),
+            stdin=stdin_file or subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            text=True
+            start_new_session=True,
+            pass_fds=pass_fds
         )
-        stdout, stderr = process.communicate(input=input_data, timeout=timeout)
-        result["stdout"] = stdout.strip()
+
+        def on_timeout():
+            timed_out.set()
+            _kill_group(process.pid)
+
+        def on_overflow():
+            overflowed.set()
+            _kill_group(process.pid)
+
+        timer = threading.Timer(wall_timeout, on_timeout)
+        timer.start()
+        try:
+            # Feed stdin and drain stderr in helper threads, stdout here, without reaping the child
+            stdout_chunks, stderr_chunks = [], []
+            feeder = None
+            if stdin_file is None:
+                feeder = threading.Thread(target=_feed, args=(process.stdin, input_data.encode("utf-8")), daemon=True)
+                feeder.start()
+            reader = threading.Thread(target=_drain, args=(process.stderr, stderr_chunks, STDERR_LIMIT), daemon=True)
+            reader.start()
+            _drain(process.stdout, stdout_chunks, STDOUT_LIMIT, on_overflow)
+            reader.join()
+            if feeder is not None:
+                feeder.join()
+
+            _, status, rusage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+        finally:
+            timer.cancel()
+            # Reap nothing further, but make sure no grandchild outlives the run
+            _kill_group(process.pid)
+
+        stdout = b"".join(stdout_chunks)
+        stderr = b"".join(stderr_chunks).decode("utf-8", errors="replace")
+        result["stdout"] = stdout if binary else stdout.decode("utf-8", errors="replace").strip()
         result["stderr"] = stderr.strip()
+        result["cpu_time"] = rusage.ru_utime + rusage.ru_stime
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        result["peak_rss"] = rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss * 1024
+
+        returncode = process.returncode
+        # SIGXCPU only comes from RLIMIT_CPU; SIGKILL past the limit comes from its hard limit
+        cpu_killed = returncode == -signal.SIGXCPU or (returncode == -signal.SIGKILL and result["cpu_time"] >= timeout)
+        if overflowed.is_set():
+            result["status"] = "OLE"
+            result["error"] = f"Output limit exceeded ({STDOUT_LIMIT} bytes of stdout)"
+        elif timed_out.is_set() or cpu_killed or result["cpu_time"] > timeout:
+            result["status"] = "TLE"
+            result["error"] = f"Execution timed out after {timeout} seconds"
+        elif returncode != 0 and memory_limit and ("std::bad_alloc" in stderr or result["peak_rss"] >= memory_limit * 0.9):
+            result["status"] = "MLE"
+            result["error"] = f"Memory limit exceeded ({memory_limit} bytes)"
+        elif returncode == -signal.SIGXFSZ:
+            result["status"] = "OLE"
+            result["error"] = f"Output limit exceeded ({output_limit} bytes)"
+        elif returncode != 0:
+            result["status"] = "RE"
+            result["error"] = f"Return code: {returncode}"
+    except Exception as e:
+        # The candidate's own failures are judged from its exit status above; this is the harness failing
+        result["status"] = "ERROR"
+        result["error"] = str(e)
+    finally:
+        if stdin_file is not None:
+            stdin_file.close()
+        result["time_elapsed"] = time.time() - start_time
+    return result
+
+
+def _run_single_input_portable(exe_file_path: str, result: Dict[str, str], input_data: TestData, timeout: int, start_time: float,
+                               binary: bool = False, pass_fds: Tuple[int, ...] = ()) -> Dict[str, str]:
+    """Fallback for platforms without `resource` (Windows): wall-clock timeout only, no limits, rusage or output cap."""
+    stdin_file = input_data.open() if isinstance(input_data, TestFile) else None
+    try:
+        process = subprocess.Popen(
+            [exe_file_path],
+            stdin=stdin_file or subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            pass_fds=pass_fds
+        )
+        stdout, stderr = process.communicate(input=None if stdin_file else input_data.encode("utf-8"), timeout=timeout)
+        result["stdout"] = stdout if binary else stdout.decode("utf-8", errors="replace").strip()
+        result["stderr"] = stderr.decode("utf-8", errors="replace").strip()
         process.wait()
-        result["error"] = "" if process.returncode == 0 else f"Return code: {process.returncode}"
+        if process.returncode != 0:
+            result["status"] = "RE"
+            result["error"] = f"Return code: {process.returncode}"
     except subprocess.TimeoutExpired:
         process.kill()
         process.wait()
+        result["status"] = "TLE"
         result["error"] = f"Execution timed out after {timeout} seconds"
     except Exception as e:
+        result["status"] = "ERROR"
         result["error"] = str(e)
     finally:
+        if stdin_file is not None:
+            stdin_file.close()
         result["time_elapsed"] = time.time() - start_time
     return result
 
 
-def run_code_with_inputs(code: str, inputs: List[str], timeout: int = 2) -> List[Dict[str, str]]:
+def compile_code(code: str, cpp_file_path: str, exe_file_path: str, use_cache: bool = True) -> Tuple[bool, str]:
+    """
+    Compile C++11 source into an executable, reusing cached binaries for identical sources.
+
+    Args:
+        code (str): The C++11 code as a string (already written to `cpp_file_path`).
+        cpp_file_path (str): Path to the source file.
+        exe_file_path (str): Path where the executable should be placed.
+        use_cache (bool): Whether to consult and populate the compile cache.
+
+    Returns:
+        Tuple[bool, str]: Whether compilation succeeded and the compiler stderr. Only a success or a failure
+            with compiler diagnostics is cached.
+
+    Raises:
+        RuntimeError: If g++ failed for reasons unrelated to the source (see `CompileServer.submit`).
+    """
+    with span("compile") as trace:
+        cache = get_compile_cache() if use_cache else None
+        if cache is not None:
+            key = cache.key(code, COMPILE_FLAGS)
+            cached = cache.fetch(key, exe_file_path)
+            if cached is not None:
+                trace.set(cached=True, success=cached[0])
+                return cached
+
+        # Hand the cold build to the long-lived compile server (precompiled standard headers)
+        success, stderr = get_compile_server(COMPILE_FLAGS).compile(code, cpp_file_path, exe_file_path)
+        trace.set(cached=False, success=success)
+
+        if cache is not None:
+            cache.store(key, exe_file_path if success else None, stderr)
+        return success, stderr
+
+
+def run_code_with_inputs(code: str, inputs: List[TestData], timeout: int = 2, order: Optional[List[int]] = None,
+                         should_stop: Optional[Callable[[Dict[str, str]], bool]] = None,
+                         priority: int = PRIORITY_EXPLORE, binary: bool = False, owner=None) -> List[Dict[str, str]]:
     """
     Compile and run the provided C++11 code with multiple inputs in parallel, capturing output or errors.
 
     Args:
         code (str): The C++11 code as a string.
-        inputs (List[str]): A list of inputs to provide to the executable.
+        inputs (List[TestData]): A list of inputs (strings or TestFile references) to provide to the executable.
         timeout (int): The maximum execution time in seconds for each input (default: 5 seconds).
+        order (Optional[List[int]]): Indices of `inputs` in the order they should be started (default: input order).
+            Inputs whose index is not listed are neither run nor reported.
+        should_stop (Optional[Callable[[Dict[str, str]], bool]]): Called with each finished result; once it returns
+            True, inputs that have not started yet are skipped and reported with the error "Skipped".
+        priority (int): Priority class of the runs in the shared execution scheduler.
+        binary (bool): Capture stdout as raw bytes (see `run_single_input`).
+        owner: Who the runs are for (e.g. the problem id); run slots are shared fairly between owners.
 
     Returns:
-        List[Dict[str, str]]: A list of dictionaries containing "stdout", "stderr", "error", and "time_elapsed".
+        List[Dict[str, str]]: A list of dictionaries containing "stdout", "stderr", "error", "status" and "time_elapsed"
+            (see `run_single_input`; "CE" marks a compilation failure, "SKIPPED" an input that was never run and
+            "ERROR" an input the harness failed to run).
     """
+    with span("run_code", tests=len(inputs) if order is None else len(order)) as trace:
+        results = _run_code_with_inputs(code, inputs, timeout, order, should_stop, priority, binary, owner)
+        trace.set(statuses=dict(Counter(result["status"] for result in results)))
+    return results
+
+
+def _run_code_with_inputs(code: str, inputs: List[TestData], timeout: int, order: Optional[List[int]],
+                          should_stop: Optional[Callable[[Dict[str, str]], bool]], priority: int, binary: bool, owner) -> List[Dict[str, str]]:
     results = []
-    tmp_dir = "tmp"
 
-    # Ensure the tmp directory exists
-    os.makedirs(tmp_dir, exist_ok=True)
+    # Borrow a private (tmpfs-backed where available) workspace; it is wiped and returned to the pool afterwards
+    with get_workspace_pool().acquire() as workspace:
+        try:
+            # Write the C++ source code into the workspace
+            with open(workspace.cpp_path, "wb") as cpp_file:
+                cpp_file.write(code.encode("utf-8"))
 
-    try:
-        # Create a temporary file for the C++ source code
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".cpp", dir=tmp_dir) as cpp_file:
-            cpp_file.write(code.encode("utf-8"))
-            cpp_file_path = cpp_file.name
-
-        # Create a temporary file path for the compiled executable
-        exe_file_path = cpp_file_path.replace(".cpp", ".exe")
-
-        # Compile the C++ code
-        compile_cmd = ["g++", "-std=c++11", cpp_file_path, "-o", exe_file_path]
-        compile_process = subprocess.run(
-            compile_cmd, capture_output=True, text=True, encoding="utf-8"
-        )
+            # Compile the C++ code (or fetch an identical earlier build from the cache)
+            compiled, compile_stderr = compile_code(code, workspace.cpp_path, workspace.exe_path)
 
-        # Check if compilation was successful
-        if compile_process.returncode != 0:
-            return [{
-                "id": id,
-                "stdout": "",
-                "stderr": compile_process.stderr,
-                "error": "Compilation failed",
-                "time_elapsed": 0
-            } for id, _ in enumerate(inputs)]
+            # Check if compilation was successful
+            if not compiled:
+                return [{
+                    "id": id,
+                    "stdout": "",
+                    "stderr": compile_stderr,
+                    "error": "Compilation failed",
+                    "status": "CE",
+                    "time_elapsed": 0
+                } for id, _ in enumerate(inputs)]
 
-        # Run all inputs in parallel using ThreadPoolExecutor
-        with ThreadPoolExecutor() as executor:
-            future_to_input = {
-                executor.submit(run_single_input, exe_file_path, id, input_data, timeout): input_data
-                for id, input_data in enumerate(inputs)
-            }
+            # Hold the executable in memory (memfd) where supported
+            exe_file_path, pass_fds = workspace.load_executable()
 
-            for future in as_completed(future_to_input):
-                try:
-                    results.append(future.result())
-                except Exception as e:
-                    results.append({
-                        "stdout": "",
-                        "stderr": "",
-                        "error": str(e),
-                        "time_elapsed": 0
-                    })
+            if order is None:
+                order = list(range(len(inputs)))
+
+            # Run all inputs in parallel in the process-wide execution scheduler
+            scheduler = get_scheduler()
+            future_to_id = {
+                scheduler.submit(bind(run_single_input), exe_file_path, id, inputs[id], timeout, binary=binary,
+                                 pass_fds=pass_fds, priority=priority, owner=owner): id
+                for id in order
+            }
 
-    except Exception as e:
-        # Handle unexpected exceptions
-        print("Unexpected exception:", e)
-        results = [{
-            "id": id,
-            "stdout": "",
-            "stderr": "",
-            "error": str(e),
-            "time_elapsed": 0
-        } for id, _ in enumerate(inputs)]
-    finally:
-        # Clean up temporary files
-        if os.path.exists(cpp_file_path):
-            os.remove(cpp_file_path)
-        if os.path.exists(exe_file_path):
             try:
-                os.remove(exe_file_path)
-            except PermissionError:
-                time.sleep(0.1)  # Wait briefly and retry
-                os.remove(exe_file_path)
+                stopped = False
+                for future in as_completed(future_to_id):
+                    if future.cancelled():
+                        continue
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {
+                            "id": future_to_id[future],
+                            "stdout": "",
+                            "stderr": "",
+                            "error": str(e),
+                            "status": "ERROR",
+                            "time_elapsed": 0
+                        }
+                    results.append(result)
+                    if not stopped and should_stop is not None and should_stop(result):
+                        stopped = True
+                        # Inputs still waiting for a slot are dropped, running ones finish normally
+                        for pending in future_to_id:
+                            pending.cancel()
+            finally:
+                # Never leave runs of this executable queued once we stop waiting for them
+                for pending in future_to_id:
+                    pending.cancel()
+                # Wait for runs already started before the workspace is wiped
+                for future in future_to_id:
+                    if not future.cancelled():
+                        try:
+                            future.exception()
+                        except Exception:
+                            pass
+
+            results.extend({
+                "id": id,
+                "stdout": "",
+                "stderr": "",
+                "error": "Skipped",
+                "status": "SKIPPED",
+                "time_elapsed": 0
+            } for future, id in future_to_id.items() if future.cancelled())
+
+        except Exception as e:
+            # The harness itself failed (e.g. the workspace filesystem is full); nothing was judged
+            print("Unexpected exception:", e)
+            results = [{
+                "id": id,
+                "stdout": "",
+                "stderr": "",
+                "error": str(e),
+                "status": "ERROR",
+                "time_elapsed": 0
+            } for id, _ in enumerate(inputs)]
 
     return sorted(results, key=lambda x: x["id"])
 
@@ -162,6 +475,7 @@ if __name__ == "__main__":
         print("STDOUT:", result["stdout"])
         print("STDERR:", result["stderr"])
         print("ERROR:", result["error"])
+        print("STATUS:", result["status"])
         print("Time Elapsed:", result["time_elapsed"])
         print("-" * 30)
 
@@ -0,0 +1,240 @@
+import time
+import random
+import itertools
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+from llm_cache import ResponseCache, ReplayMissError, request_key
+from tracing import bind, span
+
+
+# Errors that may go away on their own; every other error is raised without retrying
+RETRYABLE_ERRORS = ("rate_limit", "timeout", "server_error", "connection")
+
+
+def classify_error(error: Exception) -> str:
+    """
+    Classify an API exception as "rate_limit", "timeout", "server_error", "connection" or "other".
+
+    Works across the OpenAI and ZhipuAI clients by looking at the HTTP status and exception name.
+    """
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    name = type(error).__name__.lower()
+    if status == 429 or "ratelimit" in name or "reachlimit" in name:
+        return "rate_limit"
+    if isinstance(error, TimeoutError) or "timeout" in name or status in (408, 504):
+        return "timeout"
+    if isinstance(status, int) and status >= 500:
+        return "server_error"
+    if status is None and (isinstance(error, ConnectionError) or "connection" in name):
+        return "connection"
+    return "other"
+
+
+class AIMDLimiter:
+    """
+    Concurrency limit adapted by additive increase / multiplicative decrease.
+
+    Every success raises the limit by 1/limit (about +1 per round of calls), every
+    rate-limit or timeout response halves it. Callers block in `acquire` while the
+    number of calls in flight is at the current limit, and are admitted in arrival
+    order so that concurrent searches share the limit fairly.
+    """
+    def __init__(self, max_limit: int, initial: Optional[float] = None):
+        self.max_limit = max_limit
+        self.limit = float(initial or max_limit)
+        self.in_flight = 0
+        self._cond = threading.Condition()
+        self._tickets = itertools.count()
+        self._waiting = deque()
+
+    def acquire(self):
+        with self._cond:
+            ticket = next(self._tickets)
+            self._waiting.append(ticket)
+            while self._waiting[0] != ticket or self.in_flight >= max(1, int(self.limit)):
+                self._cond.wait()
+            self._waiting.popleft()
+            self.in_flight += 1
+            self._cond.notify_all()
+
+    def release(self, congested: bool = False):
+        with self._cond:
+            self.in_flight -= 1
+            if congested:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class SamplingEngine:
+    """
+    Concurrent chat-completion sampler.
+
+    `sample(messages, n)` issues the `n` requests concurrently (or a single request with
+    the API's multi-sample parameter when `native_n` is set), bounded by an AIMD limiter
+    shared by every caller. Calls failing with a rate limit, timeout, server or connection
+    error are retried with jittered exponential backoff; other errors (e.g. authentication
+    or invalid requests) are raised at once. Per-call latency and errors are accounted in `stats`. With a response cache,
+    recorded samples are served first and only the missing ones are requested.
+    """
+    def __init__(self, client, model: str, temperature: float = 1.0, max_in_flight: int = 8, max_retries: int = 4,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0, native_n: bool = False):
+        self.client = client
+        self.model = model
+        self.temperature = temperature
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Whether the backend honours the `n` parameter of chat completions
+        self.native_n = native_n
+
+        self.limiter = AIMDLimiter(max_in_flight)
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="llm")
+
+        self._stats_lock = threading.Lock()
+        self.calls = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.errors: Counter = Counter()
+        self.failures = 0
+
+        # Optional record/replay cache of responses
+        self.cache: Optional[ResponseCache] = None
+
+    def configure(self, max_in_flight: Optional[int] = None, cache_mode: Optional[str] = None, cache_path: Optional[str] = None,
+                  cache_max_bytes: Optional[int] = None, **kwargs):
+        """Update settings, e.g. from the `llm` section of config.yaml."""
+        if cache_mode is not None:
+            if cache_mode == "off":
+                self.cache = None
+            else:
+                cache_kwargs = {"mode": cache_mode}
+                if cache_path is not None:
+                    cache_kwargs["db_path"] = cache_path
+                if cache_max_bytes is not None:
+                    cache_kwargs["max_bytes"] = cache_max_bytes
+                self.cache = ResponseCache(**cache_kwargs)
+        if max_in_flight is not None and max_in_flight != self.limiter.max_limit:
+            self.limiter = AIMDLimiter(max_in_flight)
+            old_executor = self.executor
+            self.executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="llm")
+            old_executor.shutdown(wait=False)
+        for key, value in kwargs.items():
+            if not hasattr(self, key):
+                raise ValueError(f"Unknown sampling option: {key}")
+            setattr(self, key, value)
+
+    def _request(self, messages: List[Dict[str, str]], n: int) -> List[str]:
+        """
+        Make one chat-completion call with retries; return its sampled contents.
+
+        Raises:
+            Exception: The error of a failed call that retrying cannot fix (see `RETRYABLE_ERRORS`).
+        """
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            start_time = time.time()
+            congested = False
+            trace = span("llm.request", n=n, attempt=attempt)
+            try:
+                with trace:
+                    kwargs: Dict[str, Any] = {"model": self.model, "messages": messages, "temperature": self.temperature}
+                    if n > 1:
+                        kwargs["n"] = n
+                    response = self.client.chat.completions.create(**kwargs)
+                    contents = [choice.message.content for choice in response.choices]
+                    usage = getattr(response, "usage", None)
+                    if usage is not None:
+                        trace.set(prompt_tokens=getattr(usage, "prompt_tokens", None),
+                                  completion_tokens=getattr(usage, "completion_tokens", None))
+                self._record(time.time() - start_time)
+                return contents
+            except Exception as e:
+                kind = classify_error(e)
+                congested = kind in ("rate_limit", "timeout")
+                self._record(time.time() - start_time, kind)
+                if kind not in RETRYABLE_ERRORS:
+                    with self._stats_lock:
+                        self.failures += 1
+                    raise
+                if attempt == self.max_retries:
+                    with self._stats_lock:
+                        self.failures += 1
+                    print(f"LLM call failed after {attempt + 1} attempts ({kind}): {e}")
+                    return []
+            finally:
+                self.limiter.release(congested)
+            # Full jitter: sleep uniformly up to the exponential backoff bound
+            time.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+        return []
+
+    def _record(self, latency: float, error: Optional[str] = None):
+        with self._stats_lock:
+            self.calls += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            if error is not None:
+                self.errors[error] += 1
+
+    def sample(self, messages: List[Dict[str, str]], n: int = 1) -> List[str]:
+        """
+        Draw `n` responses for the same messages.
+
+        Args:
+            messages (List[Dict[str, str]]): The conversation to complete.
+            n (int): Number of samples.
+
+        Returns:
+            List[str]: The sampled contents; shorter than `n` only if calls still failed after all retries.
+
+        Raises:
+            ReplayMissError: In replay mode, if fewer than `n` samples were recorded for this request.
+            Exception: The error of a call that retrying cannot fix, e.g. an authentication error.
+        """
+        if n <= 0:
+            return []
+        if self.cache is None:
+            return self._sample(messages, n)
+
+        key = request_key(self.model, messages, {"temperature": self.temperature})
+        start, rsp_list = self.cache.take(key, n)
+        missing = [i for i, content in enumerate(rsp_list) if content is None]
+        if missing:
+            if self.cache.mode == "replay":
+                raise ReplayMissError(f"Only {n - len(missing)} of {n} samples recorded for request {key}")
+            # Indices of calls that still failed stay empty for a later run to fill
+            drawn = dict(zip(missing, self._sample(messages, len(missing))))
+            self.cache.put(key, {start + i: content for i, content in drawn.items()})
+            for i, content in drawn.items():
+                rsp_list[i] = content
+        return [content for content in rsp_list if content is not None]
+
+    def _sample(self, messages: List[Dict[str, str]], n: int) -> List[str]:
+        """Draw `n` fresh samples from the API."""
+        rsp_list = []
+        if self.native_n:
+            rsp_list = self._request(messages, n)[:n]
+            if len(rsp_list) == n:
+                return rsp_list
+            # The backend ignored `n` (or the call failed): draw the rest one by one
+
+        futures = [self.executor.submit(bind(self._request), messages, 1) for _ in range(n - len(rsp_list))]
+        for future in as_completed(futures):
+            rsp_list.extend(future.result())
+        return rsp_list
+
+    def stats(self) -> dict:
+        """Return call, latency and error counters."""
+        with self._stats_lock:
+            return {
+                "calls": self.calls,
+                "failures": self.failures,
+                "errors": dict(self.errors),
+                "mean_latency": self.latency_total / self.calls if self.calls else 0.0,
+                "max_latency": self.latency_max,
+                "concurrency_limit": self.limiter.limit,
+                "cache": self.cache.stats() if self.cache is not None else None,
+            }
@@ -0,0 +1,160 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+# Priority classes, lower runs first
+PRIORITY_VERIFY = 0   # Final verification of a selected solution
+PRIORITY_EXPLORE = 1  # Candidates evaluated during search
+
+
+def physical_core_count() -> int:
+    """
+    Count the physical CPU cores available to this process.
+
+    Returns:
+        int: Number of distinct (physical id, core id) pairs in /proc/cpuinfo, falling back to the logical CPU count.
+    """
+    try:
+        logical = len(os.sched_getaffinity(0))
+    except AttributeError:
+        logical = os.cpu_count() or 1
+
+    cores = set()
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            physical_id = core_id = None
+            for line in f:
+                if line.startswith("physical id"):
+                    physical_id = line.split(":", 1)[1].strip()
+                elif line.startswith("core id"):
+                    core_id = line.split(":", 1)[1].strip()
+                elif not line.strip():
+                    if core_id is not None:
+                        cores.add((physical_id, core_id))
+                    physical_id = core_id = None
+            if core_id is not None:
+                cores.add((physical_id, core_id))
+    except OSError:
+        pass
+
+    if not cores:
+        return logical
+    return max(1, min(len(cores), logical))
+
+
+class ExecutionScheduler:
+    """
+    Process-wide pool of run slots shared by every evaluation.
+
+    At most `slots` tasks run at once, so concurrent evaluations never oversubscribe the
+    cores and wall-clock timeouts stay meaningful. Waiting tasks are started by priority
+    class; within a class, start-time fair queuing over task owners (e.g. problems solved
+    concurrently) interleaves owners instead of letting one large batch monopolize the
+    slots, and tasks of one owner start in submission order.
+    """
+    def __init__(self, slots: Optional[int] = None):
+        self.slots = slots or physical_core_count()
+
+        self._queue = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        # Start-time fair queuing: virtual time of the last started task, and last tag per owner
+        self._virtual_time = 0
+        self._last_tag: Dict = {}
+
+        # Queueing metrics
+        self.submitted = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.running = 0
+        self.max_queue_depth = 0
+        self.wait_time: Dict[int, float] = {}
+        self.run_time: Dict[int, float] = {}
+        self.started: Dict[int, int] = {}
+
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"exec-slot-{i}", daemon=True)
+            for i in range(self.slots)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, fn: Callable, *args, priority: int = PRIORITY_EXPLORE, owner=None, **kwargs) -> Future:
+        """
+        Queue `fn(*args, **kwargs)` for execution in a run slot.
+
+        Args:
+            fn (Callable): The function to run.
+            priority (int): Priority class, e.g. PRIORITY_VERIFY or PRIORITY_EXPLORE.
+            owner: Who the task is run for (e.g. a problem id); slots are shared fairly between owners.
+
+        Returns:
+            Future: The future of the call; cancelling it before it starts drops it from the queue.
+        """
+        future = Future()
+        with self._cond:
+            tag = max(self._virtual_time, self._last_tag.get(owner, self._virtual_time)) + 1
+            self._last_tag[owner] = tag
+            heapq.heappush(self._queue, (priority, tag, next(self._counter), time.time(), future, fn, args, kwargs))
+            self.submitted += 1
+            self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+            self._cond.notify()
+        return future
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                priority, tag, _, queued_at, future, fn, args, kwargs = heapq.heappop(self._queue)
+                self._virtual_time = max(self._virtual_time, tag)
+                if not future.set_running_or_notify_cancel():
+                    self.cancelled += 1
+                    continue
+                self.running += 1
+                self.started[priority] = self.started.get(priority, 0) + 1
+                self.wait_time[priority] = self.wait_time.get(priority, 0.0) + time.time() - queued_at
+
+            start_time = time.time()
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._cond:
+                    self.running -= 1
+                    self.completed += 1
+                    self.run_time[priority] = self.run_time.get(priority, 0.0) + time.time() - start_time
+
+    def stats(self) -> dict:
+        """Return queueing metrics: counts, current queue depth and mean wait/run time per priority class."""
+        with self._cond:
+            return {
+                "slots": self.slots,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+                "running": self.running,
+                "queued": len(self._queue),
+                "max_queue_depth": self.max_queue_depth,
+                "mean_wait": {p: self.wait_time[p] / n for p, n in self.started.items()},
+                "mean_run": {p: self.run_time.get(p, 0.0) / n for p, n in self.started.items()},
+                "run_time": dict(self.run_time),
+            }
+
+
+_default_scheduler: Optional[ExecutionScheduler] = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(slots: Optional[int] = None) -> ExecutionScheduler:
+    """Return the process-wide execution scheduler, starting it with `slots` run slots on first use."""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = ExecutionScheduler(slots)
+        return _default_scheduler
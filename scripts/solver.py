@@ -0,0 +1,71 @@
+from tqdm import tqdm
+from typing import Any, Dict, Optional, Tuple
+from checkpoint import SearchCheckpoint, stop_requested
+from fidelity import MultiFidelityReward
+from mcts import MCTSTree
+from treeofthoughts import TreeofToughts
+from pipeline import pipelined_vanilla
+
+METHODS = ("mcts", "vanilla", "tot")
+
+
+def run_method(generator, evaluator, method_name: str, method_config: Dict[str, Any], pipeline_depth: int = 0,
+               dedup: str = "tokens", parallel: int = 1, transpositions: bool = True,
+               fidelity_config: Optional[Dict[str, Any]] = None,
+               checkpoint: Optional[SearchCheckpoint] = None) -> Tuple[str, float, int, int]:
+    """
+    Search for a solution with one of the methods of config.yaml.
+
+    Args:
+        generator: A tree generator (e.g. GLMGeneratorTree) providing generate_code, generate_thoughts and generate_code_w_thoughts.
+        evaluator: The problem's Evaluator.
+        method_name (str): "mcts", "vanilla" or "tot".
+        method_config (Dict[str, Any]): The method's section of config.yaml.
+        pipeline_depth (int): Number of speculative generations kept in flight (0 disables pipelining).
+        dedup (str): Canonicalization of candidate programs ("off", "tokens" or "identifiers").
+        parallel (int): Number of MCTS leaves expanded concurrently (1 for the sequential search).
+        transpositions (bool): Whether tree branches that derive the same state share one node.
+        fidelity_config (Dict[str, Any]): The fidelity section of config.yaml; with a positive sample_size, tree
+            searches score candidates on a sample of the tests and only promising ones on the whole suite.
+        checkpoint (SearchCheckpoint): Where tree searches save snapshots of their state and resume from.
+
+    Returns:
+        Tuple[str, float, int, int]: The selected code, its score, the revision and the budget used.
+    """
+    fidelity_config = fidelity_config or {}
+    if fidelity_config.get("sample_size", 0) > 0:
+        tree_reward = MultiFidelityReward(evaluator, fidelity_config["sample_size"], fidelity_config.get("eta", 3),
+                                          fidelity_config.get("promote", 0.5))
+    else:
+        tree_reward = evaluator.evaluate_code
+
+    if method_name == "mcts":
+        mcts = MCTSTree(generator.generate_code, tree_reward, max_w = method_config["max_w"], step = method_config["step"], budget = method_config["budget"], bp_policy=method_config["bp_policy"],derive_policy=method_config["derive_policy"], pipeline_depth=pipeline_depth, dedup=dedup, parallel=parallel, transpositions=transpositions, checkpoint=checkpoint)
+        code_file, score, revision, budget = mcts.search()
+    elif method_name == "vanilla" and pipeline_depth > 0:
+        code_file, score, revision, budget = pipelined_vanilla(lambda: generator.generate_code()[0], evaluator.evaluate_code,
+                                                               method_config["budget"], pipeline_depth)
+    elif method_name == "vanilla":
+        best_score = 0
+        code_file = ""
+        for b in tqdm(range(method_config["budget"]), desc="Vanilla"):
+            if stop_requested():
+                raise KeyboardInterrupt
+            code = generator.generate_code()[0]
+            score = evaluator.evaluate_code(code)
+            budget = b + 1
+            if score >= best_score:
+                best_score = score
+                code_file = code
+            if score == 1.0:
+                code_file = code
+                break
+        revision = 0
+        score = best_score
+    elif method_name == "tot":
+        tot = TreeofToughts(generator.generate_thoughts,tree_reward,generator.generate_code_w_thoughts, max_w = method_config["max_w"], step = method_config["step"], budget = method_config["budget"], bp_policy=method_config["bp_policy"], derive_policy=method_config["derive_policy"], rollout_num = method_config["rollout_num"], dedup=dedup, transpositions=transpositions, checkpoint=checkpoint)
+        code_file, score, revision, budget = tot.search()
+    else:
+        raise ValueError(f"Method {method_name} not supported, choose from: mcts, vanilla")
+
+    return code_file, score, revision, budget
@@ -0,0 +1,69 @@
+import os
+import mmap
+from contextlib import contextmanager
+from typing import Any, Dict, List, Tuple, Union
+
+
+class TestFile:
+    """
+    Reference to a test input or output stored as a file.
+
+    The runner hands inputs to the candidate as a stdin file descriptor and the
+    evaluator compares outputs through a memory map, so test data never has to be
+    copied into Python strings.
+    """
+    __slots__ = ("path",)
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __len__(self) -> int:
+        return os.path.getsize(self.path)
+
+    def __repr__(self) -> str:
+        return f"TestFile({self.path!r})"
+
+    def open(self):
+        """Open the file for binary reading, e.g. to pass as stdin."""
+        return open(self.path, "rb")
+
+    @contextmanager
+    def mapped(self):
+        """Memory-map the file read-only; yields bytes-like data (b"" for an empty file)."""
+        with self.open() as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield b""
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield data
+
+    def read(self) -> str:
+        """Read the whole file as text (for prompts and debugging, not the hot path)."""
+        with open(self.path, "r", encoding="utf-8") as f:
+            return f.read()
+
+
+TestData = Union[str, TestFile]
+
+
+def load_tests(entry: Dict[str, Any], base_dir: str) -> Tuple[List[TestData], List[TestData]]:
+    """
+    Return the inputs and outputs of a problem entry of data.jsonl.
+
+    Entries written by `process_data.py --inline` carry the tests as strings in "inputs"/"outputs".
+    Entries written by reference carry "tests_dir" plus "input_files"/"output_files", relative to `base_dir`.
+
+    Args:
+        entry (Dict[str, Any]): A problem entry of data.jsonl.
+        base_dir (str): Directory containing data.jsonl.
+
+    Returns:
+        Tuple[List[TestData], List[TestData]]: The inputs and expected outputs, as strings or TestFile references.
+    """
+    if "input_files" not in entry:
+        return entry["inputs"], entry["outputs"]
+
+    tests_dir = os.path.join(base_dir, entry["tests_dir"])
+    inputs = [TestFile(os.path.join(tests_dir, name)) for name in entry["input_files"]]
+    outputs = [TestFile(os.path.join(tests_dir, name)) for name in entry["output_files"]]
+    return inputs, outputs
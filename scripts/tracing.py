@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from typing import Any, Callable, Optional
+
+# The problem the current code runs for; carried into worker threads by `bind`
+current_problem: contextvars.ContextVar = contextvars.ContextVar("current_problem", default=None)
+
+
+class Span:
+    """A timed phase; attributes added with `set` are written with it when it ends."""
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, args: dict):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0.0
+
+    def set(self, **args) -> None:
+        self.args.update(args)
+
+    def __enter__(self) -> "Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.emit(self.name, self.start, time.perf_counter() - self.start, self.args)
+
+
+class _NoopSpan:
+    """Returned by `span` while tracing is off, so instrumented code pays one global lookup."""
+    __slots__ = ()
+
+    def set(self, **args) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """
+    Writes spans as Chrome trace events ("X" complete events), one per line.
+
+    The file starts with "[" and every event ends with ",", which chrome://tracing and
+    Perfetto accept without a closing bracket, so a crashed run still leaves a loadable
+    trace. Each event carries the problem id (if known) in its args.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(path, "w", encoding="utf-8")
+        self._file.write("[\n")
+        # perf_counter is monotonic but has an arbitrary origin; anchor it to wall-clock time
+        self._origin = time.time() - time.perf_counter()
+        self._pid = os.getpid()
+
+    def emit(self, name: str, start: float, duration: float, args: dict) -> None:
+        problem = current_problem.get()
+        if problem is not None:
+            args.setdefault("problem", problem)
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": round((self._origin + start) * 1e6),
+            "dur": round(duration * 1e6),
+            "pid": self._pid,
+            "tid": threading.get_ident(),
+            "args": args,
+        }
+        line = json.dumps(event, ensure_ascii=False, default=str) + ",\n"
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line)
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+_tracer: Optional[Tracer] = None
+
+
+def configure_tracing(path: Optional[str]) -> Optional[Tracer]:
+    """Start writing spans to `path` (None turns tracing off)."""
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+    _tracer = Tracer(path) if path else None
+    return _tracer
+
+
+def span(name: str, **args):
+    """
+    Time a phase of the pipeline, e.g. `with span("compile", cached=False): ...`.
+
+    Returns a no-op span when tracing is off.
+    """
+    if _tracer is None:
+        return NOOP_SPAN
+    return Span(_tracer, name, args)
+
+
+def bind(fn: Callable) -> Callable:
+    """
+    Wrap `fn` to run in a copy of the caller's context, so spans in worker threads keep the problem id.
+
+    Bind once per submission: a context cannot be entered by two threads at once. Returns `fn` itself while tracing is off.
+    """
+    if _tracer is None:
+        return fn
+    context = contextvars.copy_context()
+
+    def run(*args: Any, **kwargs: Any):
+        return context.run(fn, *args, **kwargs)
+    return run
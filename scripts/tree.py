@@ -1,7 +1,12 @@
-from typing import Optional
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, Tuple
+from fidelity import fidelity
+from checkpoint import stop_requested
 
 # Definition of a TreeNode class to represent a node in the tree
 class TreeNode:
+    # Fixed attribute layout: no per-node __dict__, which matters for large trees
+    __slots__ = ("state", "action", "score", "fidelity", "children", "parent", "parents", "value", "visit", "depth", "actions")
+
     def __init__(self, state = None, action = None, parent = None, score: float = 0):
         # The state (prompt) associated with this node
         self.state = state
@@ -9,11 +14,15 @@ class TreeNode:
         self.action = action
         # The score provided by execution (reward)
         self.score = score
+        # Share of the tests the score was measured on (below 1.0 for multi-fidelity partial rewards)
+        self.fidelity = fidelity(score)
         
         # A list of child nodes (initially empty)
         self.children: list[TreeNode] = []
         # Reference to the parent node (if any)
         self.parent: TreeNode = parent
+        # Further parents whose children reached the same state, through a transposition table (None in a plain tree)
+        self.parents: Optional[list[TreeNode]] = None
 
         # The accumulated value of this node
         self.value = 0
@@ -22,12 +31,74 @@ class TreeNode:
         # The depth of this node in the tree (0 for the root, parent depth + 1 otherwise)
         self.depth = parent.depth + 1 if parent else 0
 
-        # A set of possible actions (code) from this node
-        self.actions: Optional[set[str]] = None
+        # The untried actions (code) from this node, without duplicates; tried from the end
+        self.actions: Optional[list[str]] = None
+
+    def link(self, parent: "TreeNode"):
+        """Make this node a child of `parent` as well, when `parent` derived the same state."""
+        if parent is self.parent or (self.parents is not None and parent in self.parents):
+            return
+        if self.parents is None:
+            self.parents = []
+        self.parents.append(parent)
+        parent.children.append(self)
+
+    def lineage(self) -> Iterator["TreeNode"]:
+        """
+        Yield this node and each of its ancestors once, level by level from the deepest.
+
+        In a DAG built by a `TranspositionTable` this follows every parent, so a node is only
+        reached after all of its descendants on the way up.
+        """
+        node = self
+        while node is not None and node.parents is None:
+            yield node
+            node = node.parent
+        level = [node] if node is not None else []
+        while level:
+            parents: Dict[int, TreeNode] = {}
+            for node in level:
+                yield node
+                if node.parent is not None:
+                    parents[id(node.parent)] = node.parent
+                for parent in node.parents or ():
+                    parents[id(parent)] = parent
+            level = list(parents.values())
+
+
+class TranspositionTable:
+    """
+    Maps states to the node holding them, so branches that derive the same state share one node.
+
+    Keys include the depth: edges always lead one level down, which keeps the graph acyclic and
+    gives a shared node the same depth (revision) along every path.
+    """
+    def __init__(self, key: Optional[Callable[[Any], Hashable]] = None):
+        # Canonicalization of states (None compares them as they are)
+        self.key = key
+        self.nodes: Dict[Tuple[int, Hashable], TreeNode] = {}
+        # Number of derived states that were found in the table
+        self.hits = 0
+
+    def _key(self, state: Any, depth: int) -> Tuple[int, Hashable]:
+        return depth, self.key(state) if self.key is not None else state
+
+    def get(self, state: Any, depth: int) -> Optional[TreeNode]:
+        """Return the node holding `state` at `depth`, if any."""
+        node = self.nodes.get(self._key(state, depth))
+        if node is not None:
+            self.hits += 1
+        return node
+
+    def add(self, node: TreeNode):
+        self.nodes.setdefault(self._key(node.state, node.depth), node)
 
 
 # Definition of a Tree class to manage the entire tree structure
 class Tree:
+    # Number of best partially scored nodes kept as candidates for `verified_best`
+    PARTIAL_CANDIDATES = 5
+
     def __init__(self, getAction, getReward, rollout, max_w=3, step=5, budget=50):
         # Initialize the root of the tree with the given initial state (prompt)
         self.root = TreeNode()
@@ -45,6 +116,83 @@ class Tree:
         self.getReward = getReward
         # Function to generate the result and next state
         self.rollout = rollout
+        # Full-suite scoring of a candidate, when `getReward` only scores promising ones on every test
+        self.verify: Optional[Callable[[str], float]] = getattr(getReward, "verify", None)
+        # The highest-scoring node so far, maintained as nodes are added (see `track_best`)
+        self.best_node: Optional[TreeNode] = None
+        # The nodes with the highest partial (sampled) scores, best first; candidates for `verified_best`
+        self.partial_candidates: list[TreeNode] = []
+
+        # Budget used so far, carried over when a search is restored from a snapshot
+        self.spent = 0
+        # Actions taken out of their node for evaluations in flight (future -> (node, action)); saved as untried
+        self.in_flight: Dict[Any, Tuple[TreeNode, Optional[str]]] = {}
+        # SearchCheckpoint the search state is saved to and restored from (None keeps it in memory only)
+        self.checkpoint = None
+
+    def run_checkpointed(self, search: Callable[[], Tuple]) -> Tuple:
+        """
+        Run `search`, first restoring the snapshot of the checkpoint, if any, and snapshotting the tree
+        when the search ends or is interrupted. A restored search that was already over returns at once.
+        """
+        if self.checkpoint is None:
+            return search()
+        if self.checkpoint.restore(self):
+            best = self.best_node or self.root
+            if best.score == 1.0 or self.root.length_exceeded:
+                code, score, revision = self.final_select()
+                return code, score, revision, self.spent
+        try:
+            result = search()
+        except BaseException:
+            self.checkpoint.save(self)
+            raise
+        self.checkpoint.save(self)
+        return result
+
+    def checkpoint_step(self):
+        """Called between expansions: take a periodic or requested snapshot, and stop if the run is being interrupted."""
+        if self.checkpoint is not None and self.checkpoint.due():
+            self.checkpoint.save(self)
+        if stop_requested():
+            raise KeyboardInterrupt
+
+    def track_best(self, node: TreeNode):
+        """
+        Record a new node as the best one if it scores higher, or equally but deeper (more revised).
+        Only full-fidelity scores are trusted; partial scores are tracked separately.
+        """
+        if node.fidelity < 1.0:
+            candidates = [other for other in self.partial_candidates if other is not node] + [node]
+            candidates.sort(key=lambda other: other.score, reverse=True)
+            self.partial_candidates = candidates[:self.PARTIAL_CANDIDATES]
+            return
+        best = self.best_node or self.root
+        if node.score > best.score or (node.score == best.score and node.depth > best.depth):
+            self.best_node = node
+
+    def verified_best(self, program: Callable[[TreeNode], str]) -> TreeNode:
+        """
+        Return the best node by full-fidelity score.
+
+        While the best partial candidate scores higher than the best full-fidelity node (or there is none
+        yet), its program (given by `program`) is scored on the whole suite with `verify` so it can take
+        part, going down the candidates in order. Without `verify`, an unverified partial candidate is
+        returned only if no node has a full-fidelity score. The root is returned only if nothing was scored.
+        """
+        while self.partial_candidates and self.verify is not None:
+            candidate = self.partial_candidates[0]
+            if self.best_node is not None and candidate.score <= self.best_node.score:
+                break
+            self.partial_candidates.pop(0)
+            # A transposition may have given the candidate a full-fidelity score since
+            if candidate.fidelity < 1.0:
+                candidate.score = self.verify(program(candidate))
+                candidate.fidelity = 1.0
+            self.track_best(candidate)
+        if self.best_node is not None:
+            return self.best_node
+        return self.partial_candidates[0] if self.partial_candidates else self.root
     def print_tree(self, node=None, indent="#####\n", level=0):
         """Print the tree structure starting from a given node."""
         if node is None:
@@ -1,19 +1,36 @@
 import math
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
-from tree import Tree, TreeNode
+from tree import Tree, TreeNode, TranspositionTable
+from canonical import RewardMemo, code_key, text_key, unique_actions
+from fidelity import PartialReward, fidelity, lower_bound
+from tracing import bind, span
 
 class ToTNode(TreeNode):
+    __slots__ = ("length_exceeded", "result", "multiplicity", "action_counts", "rollout_times")
+
     def __init__(self, state = None, action = None, parent = None, score = 0, length_exceeded = False, result = None):
         super().__init__(state, action, parent, score)
         self.length_exceeded = length_exceeded
         self.result = result
+        # Number of sampled thoughts this node stands for (1 + merged duplicates)
+        self.multiplicity = 1
+        # Sampled copies of every pending thought, when thoughts are deduplicated
+        self.action_counts = None
+        # Seconds taken by each completed rollout of the expansion that created (or last updated) this node
+        self.rollout_times = None
     def is_fully_expanded(self):
         """Check if all possible children have been expanded."""
         return self.actions is not None and len(self.actions) == 0
     
-    def expand(self, getAction, getReward, rollout, max_a, step, policy = "append", rollout_num = 1):
+    def expand(self, getAction, getReward, rollout, max_a, step, policy = "append", rollout_num = 1, key = None, table = None, executor = None):
         """
         Expand the node by creating a new child node for an unexplored action.
+        With an `executor`, the rollouts (LLM call and evaluation) run concurrently. Once one of them
+        reaches 1.0 the others are abandoned: those not started never run, and running ones skip
+        their remaining LLM call or evaluation. A call already under way finishes, and its result is dropped.
         Parameters:
             getAction: (max_a, state, policy) -> list of actions
             getReward: (result) -> reward
@@ -21,86 +38,182 @@ class ToTNode(TreeNode):
             max_a: int, maximum number of actions
             step: int, number of steps
             policy: str, "append" or "modify"
+            key: (action) -> canonical key, merges equivalent thoughts into one child (None keeps raw strings)
+            table: TranspositionTable, shares the child with other branches that reached the same thought chain
+            executor: ThreadPoolExecutor running the rollouts (None runs them one after another)
+        Returns:
+            The child, the reward and the number of sampled copies of the action.
+            The reward is 1.0 if a rollout solved the problem, and the mean reward of the rollouts otherwise
+            (a `PartialReward` with the fidelity of the least-tested rollout if any was partial).
         """
         if self.actions is None:
-            self.actions = set(getAction(max_a, self.state, policy))
+            actions = getAction(max_a, self.state, policy)
+            if key is None:
+                self.actions = list(dict.fromkeys(actions))
+            else:
+                self.action_counts = unique_actions(actions, key)
+                self.actions = list(self.action_counts)
         
         action = self.actions.pop()
-        max_reward = float("-inf")
-        total_reward = 0
-        final_child = None
-        final_result = None
-        for _ in range(rollout_num):
-            if policy == "append":
-                result, child_state = rollout(action,self.state)
-            elif policy == "modify":
-                result, child_state = rollout(action)
-            reward = getReward(result)
-            if reward > max_reward:
-                max_reward = reward
-                final_child = child_state
-                final_result = result
-            total_reward += reward
-        
-        child_node = ToTNode(final_child, action, self, total_reward/rollout_num, False, final_result)
-        self.children.append(child_node)
-        
-        return child_node, reward
+        # Set once a rollout solves the problem (or the expansion is interrupted), so that the others stop
+        abandoned = threading.Event()
+
+        def run_rollout(index):
+            start = time.perf_counter()
+            with span("rollout", index=index) as trace:
+                if abandoned.is_set():
+                    trace.set(abandoned=True)
+                    return None
+                if policy == "append":
+                    result, child_state = rollout(action,self.state)
+                elif policy == "modify":
+                    result, child_state = rollout(action)
+                if abandoned.is_set():
+                    trace.set(abandoned=True)
+                    return None
+                reward = getReward(result)
+            return index, result, child_state, reward, time.perf_counter() - start
+
+        outcomes = []
+        try:
+            if executor is None or rollout_num == 1:
+                for index in range(rollout_num):
+                    outcomes.append(run_rollout(index))
+                    if outcomes[-1][3] == 1.0:
+                        break
+            else:
+                futures = [executor.submit(bind(run_rollout), index) for index in range(rollout_num)]
+                for future in as_completed(futures):
+                    outcomes.append(future.result())
+                    if outcomes[-1][3] == 1.0:
+                        abandoned.set()
+                        for other in futures:
+                            other.cancel()
+                        break
+        except BaseException:
+            abandoned.set()
+            # Keep the thought untried, e.g. for a snapshot of an interrupted search
+            self.actions.append(action)
+            raise
+        # Results do not depend on completion order
+        outcomes.sort()
+
+        # The first rollout with the highest reward gives the child's state and program
+        _, final_result, final_child, max_reward, _ = max(outcomes, key=lambda outcome: outcome[3])
+        solved = max_reward == 1.0
+        score = 1.0 if solved else sum(outcome[3] for outcome in outcomes) / len(outcomes)
+        # The node's score is only as reliable as its least-tested rollout
+        min_fidelity = 1.0 if solved else min(fidelity(outcome[3]) for outcome in outcomes)
+        if min_fidelity < 1.0:
+            score = PartialReward(score, min_fidelity)
+        rollout_times = [outcome[4] for outcome in outcomes]
+
+        copies = self.action_counts.pop(action) if self.action_counts is not None else 1
+        child_node = table.get(final_child, self.depth + 1) if table is not None else None
+        if child_node is None:
+            child_node = ToTNode(final_child, action, self, score, False, final_result)
+            child_node.fidelity = min_fidelity
+            child_node.rollout_times = rollout_times
+            child_node.multiplicity = copies
+            self.children.append(child_node)
+            if table is not None:
+                table.add(child_node)
+        else:
+            child_node.link(self)
+            child_node.multiplicity += copies
+            # A solving rollout is always kept, since the search returns it
+            if (min_fidelity, score) > (child_node.fidelity, child_node.score) or solved:
+                child_node.action, child_node.score, child_node.result = action, score, final_result
+                child_node.fidelity = min_fidelity
+                child_node.rollout_times = rollout_times
+
+        return child_node, score, copies
 
     def best_child(self, exploration_weight=1.0):
         """Select the best child node using the UCB formula."""
-        return max(
-            [child for child in self.children if not child.length_exceeded],
-            key=lambda child: child.value / (child.visit + 1e-6) +
-                exploration_weight * math.sqrt(math.log(self.visit + 1) / (child.visit + 1e-6))
-        )
+        log_visit = math.log(self.visit + 1)
+        best, best_ucb = None, float("-inf")
+        for child in self.children:
+            if child.length_exceeded:
+                continue
+            visit = child.visit + 1e-6
+            ucb = child.value / visit + exploration_weight * math.sqrt(log_visit / visit)
+            if ucb > best_ucb:
+                best, best_ucb = child, ucb
+        if best is None:
+            raise ValueError("No expandable child")
+        return best
         
-    def bp(self, reward, policy):
-        """Propagate the reward of a simulation up the tree."""
-        self.visit += 1
-        if policy == "max":
-            self.value = max(reward, self.value)
-        elif policy == "accumulate":
-            self.value += reward
-        else:
+    def bp(self, reward, policy, visits = 1):
+        """
+        Propagate the reward of a simulation (counted `visits` times) to every ancestor once, iteratively.
+        A partial reward counts as whole visits worth its full-suite lower bound.
+        """
+        if policy not in ("max", "accumulate"):
             raise ValueError("Invalid BP policy, should be 'max' or 'accumulate'")
-        
-        if self.is_fully_expanded():
-            length_exceeded = True
-            for child in self.children:
-                if not child.length_exceeded:
-                    length_exceeded = False
-                    break
-            self.length_exceeded = length_exceeded
-        
-        if self.parent:
-            self.parent.bp(reward, policy)
+        value = lower_bound(reward)
+        for node in self.lineage():
+            node.visit += visits
+            if policy == "max":
+                node.value = max(value, node.value)
+            else:
+                node.value += value * visits
+            
+            if node.is_fully_expanded():
+                node.length_exceeded = all(child.length_exceeded for child in node.children)
 
 class TreeofToughts(Tree):
-    def __init__(self, getAction, getReward, rollout, max_w = 3, step = 5, budget = 30, bp_policy="max", derive_policy = "append", rollout_num = 1):
+    def __init__(self, getAction, getReward, rollout, max_w = 3, step = 5, budget = 30, bp_policy="max", derive_policy = "append", rollout_num = 1, dedup = "tokens", transpositions = True, checkpoint = None):
         super().__init__(getAction, getReward, rollout, max_w, step, budget)
         self.root = ToTNode()
         self.bp_policy = bp_policy
         self.derive_policy = derive_policy
         self.rollout_num = rollout_num
+        # Thoughts are merged when equal up to whitespace; programs by their canonical form ("off", "tokens" or "identifiers")
+        result_key = code_key(dedup)
+        self.action_key = text_key if result_key is not None else None
+        if result_key is not None:
+            self.getReward = RewardMemo(self.getReward, result_key)
+        # Nodes shared by branches that reach the same thought chain
+        if transpositions:
+            chain_key = (lambda thoughts: tuple(map(self.action_key, thoughts))) if self.action_key is not None else tuple
+            self.table = TranspositionTable(chain_key)
+        else:
+            self.table = None
+        self.checkpoint = checkpoint
         if self.bp_policy not in ["max", "accumulate"]:
             raise ValueError("Invalid BP policy, should be 'max' or 'accumulate'")
         if self.derive_policy not in ["append", "modify"]:
             raise ValueError("Invalid derive_policy, should be 'append' or 'modify'")
     def search(self):
-        """Perform MCTS search for a given number of iterations."""
-        for b in tqdm(range(self.budget, 0, -self.rollout_num), desc="ToT searching"):
-            node: ToTNode = self.select()
-            max_a = min(b, self.max_w)
-            node, reward = node.expand(self.getAction, self.getReward, self.rollout, max_a, self.step, self.derive_policy, self.rollout_num)
-            if reward == 1.0:
-                # self.print_tree()
-                return node.result, 1.0, node.depth - 1, self.budget - b + 1
-            node.bp(reward, self.bp_policy)
-            if self.root.length_exceeded:
-                code, score, revision = self.final_select()
-                # self.print_tree()
-                return code, score, revision, self.budget - b + 1
+        """Perform MCTS search for a given number of iterations, resuming from a snapshot of the checkpoint if there is one."""
+        return self.run_checkpointed(self.search_rollouts)
+
+    def search_rollouts(self):
+        """Expand one node at a time, with its rollouts running concurrently."""
+        # The rollouts of an expansion run concurrently
+        executor = ThreadPoolExecutor(max_workers=self.rollout_num, thread_name_prefix="rollout") if self.rollout_num > 1 else None
+        try:
+            for b in tqdm(range(self.budget - self.spent, 0, -self.rollout_num), desc="ToT searching"):
+                node: ToTNode = self.select()
+                max_a = min(b, self.max_w)
+                node, reward, visits = node.expand(self.getAction, self.getReward, self.rollout, max_a, self.step, self.derive_policy, self.rollout_num, self.action_key, self.table, executor)
+                self.spent = self.budget - b + self.rollout_num
+                self.track_best(node)
+                if reward == 1.0:
+                    # self.print_tree()
+                    return node.result, 1.0, node.depth - 1, self.budget - b + 1
+                # Merged duplicates count as simulations with the same reward
+                node.bp(reward, self.bp_policy, visits)
+                if self.root.length_exceeded:
+                    code, score, revision = self.final_select()
+                    # self.print_tree()
+                    return code, score, revision, self.budget - b + 1
+                self.checkpoint_step()
+        finally:
+            if executor is not None:
+                # Abandoned rollouts finish the call they are in without being waited for
+                executor.shutdown(wait=False, cancel_futures=True)
             
         # self.print_tree()
             
@@ -118,18 +231,6 @@ class TreeofToughts(Tree):
         return node
     
     def final_select(self):
-        """Traverse the entire tree and select the node with the highest score."""
-        def traverse(node: ToTNode):
-            """Recursively traverse the tree to find the node with the highest score."""
-            best_node = node
-            for child in node.children:
-                candidate: ToTNode = traverse(child)
-                if candidate.score > best_node.score:
-                    best_node = candidate
-                elif candidate.score == best_node.score and candidate.depth > best_node.score:
-                    best_node = candidate
-            return best_node
-
-        # Start traversal from the root and return the action of the best node
-        best_node = traverse(self.root)
+        """Return the node with the highest full-fidelity score (the deepest one among equals), tracked as nodes were added."""
+        best_node = self.verified_best(lambda node: node.result)
         return best_node.result, best_node.score, best_node.depth - 1
\ No newline at end of file
@@ -5,33 +5,31 @@ import argparse
 from openai import OpenAI
 from zhipuai import ZhipuAI
 from typing import List, Dict, Any
+from sampler import SamplingEngine
+from tracing import span
 
 client = ZhipuAI(api_key="98903f4152cd6b8cc8a1d4d16ff11a59.JO98BUYm6Bl4YVFf")
 
+# Shared by every generator; concurrency and retry settings come from the `llm` section of config.yaml
+sampling_engine = SamplingEngine(client, model="codegeex-4", temperature=1.0)
+
 def generate_response(messages: List[Dict[str, str]], n: int = 1) -> List[str]:
     """
-    Generate a response from the model using the provided messages.
+    Generate responses from the model using the provided messages.
+
+    The `n` samples are requested concurrently through the shared sampling engine, which adapts
+    the number of calls in flight to rate limits and retries failed calls with jittered backoff.
 
     Args:
         messages (List[Dict[str, str]]): A list of messages forming the conversation history.
+        n (int): The number of responses to sample.
 
     Returns:
-        str: The response content from the model.
+        List[str]: The response contents from the model (fewer than `n` only if calls kept failing).
     """
-    rsp_list = []
-    for _ in range(n):
-        try:
-            # Request a chat completion from the model.
-            response = client.chat.completions.create(
-                model="codegeex-4",  # Specify the model to use.
-                messages=messages,  # Provide the conversation history.
-                temperature=1.0,  # Set temperature for deterministic responses.
-            ).choices[0].message.content
-            rsp_list.append(response)
-        except:
-            # Return an empty string in case of an error.
-            pass
-
+    with span("llm.generate", n=n, prompt_chars=sum(len(message["content"]) for message in messages)) as trace:
+        rsp_list = sampling_engine.sample(messages, n)
+        trace.set(samples=len(rsp_list))
     return rsp_list
 
 def parse_args():
@@ -45,6 +43,13 @@ def parse_args():
     parser.add_argument('-md', '--model_name', type=str, required=True, help='Name of the model to use')
     parser.add_argument('-mt', '--method_name', type=str, help='Name of the method to execute')
     parser.add_argument('-i', '--iterations', type=int, default=3, help='Number of iterations to perform')
+    parser.add_argument('--ids', type=int, nargs='+', help='Only solve the problems with these ids')
+    parser.add_argument('--start', type=int, help='Only solve problems with id >= start')
+    parser.add_argument('--end', type=int, help='Only solve problems with id <= end')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of problems to solve concurrently')
+    parser.add_argument('--llm_cache', type=str, choices=['off', 'record', 'replay'], help='Override the LLM response cache mode of config.yaml')
+    parser.add_argument('--trace', type=str, help='Write phase timings to this trace file (overrides config.yaml)')
+    parser.add_argument('--warm_start', type=str, help='Checkpoint directory of an earlier run (e.g. with a smaller budget) to continue searches from')
     args = parser.parse_args()
     return args
 
@@ -0,0 +1,130 @@
+import os
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple, Union
+from testfiles import TestData, TestFile
+
+
+def test_digest(input_data: TestData, output_data: TestData) -> str:
+    """
+    Hash the contents of a test, so cached verdicts are invalidated when the test data changes.
+
+    Args:
+        input_data (TestData): The test input, as a string or a TestFile.
+        output_data (TestData): The expected output, as a string or a TestFile.
+
+    Returns:
+        str: Hex digest of the input and output contents.
+    """
+    digest = hashlib.sha256()
+    for data in (input_data, output_data):
+        if isinstance(data, TestFile):
+            with data.open() as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        else:
+            digest.update(data.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def output_digest(stdout: Union[str, bytes]) -> str:
+    if isinstance(stdout, str):
+        stdout = stdout.encode("utf-8")
+    return hashlib.sha256(stdout).hexdigest()
+
+
+class VerdictCache:
+    """
+    Persistent SQLite cache of per-test verdicts.
+
+    Rows are keyed by (code hash, test digest, settings), where the code hash covers the
+    normalized source and compiler flags and the settings string covers everything else
+    that can change a verdict (time limit, float tolerance). The database is opened in
+    WAL mode so several processes can share it.
+    """
+    def __init__(self, db_path: str = os.path.join("results", "verdicts.sqlite")):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS verdicts (
+                    code_hash TEXT NOT NULL,
+                    test_hash TEXT NOT NULL,
+                    settings TEXT NOT NULL,
+                    passed INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    time_elapsed REAL NOT NULL,
+                    cpu_time REAL NOT NULL,
+                    output_digest TEXT NOT NULL,
+                    PRIMARY KEY (code_hash, test_hash, settings)
+                )
+            """)
+
+    def lookup(self, code_hash: str, test_hashes: List[str], settings: str) -> Dict[str, Tuple[bool, str]]:
+        """
+        Fetch cached verdicts.
+
+        Args:
+            code_hash (str): Hash of the candidate code.
+            test_hashes (List[str]): Digests of the tests to look up.
+            settings (str): Evaluation settings the verdicts must have been produced under.
+
+        Returns:
+            Dict[str, Tuple[bool, str]]: Test digest -> (passed, status) for every cached test.
+        """
+        found: Dict[str, Tuple[bool, str]] = {}
+        with self._lock:
+            for test_hash in set(test_hashes):
+                row = self._conn.execute(
+                    "SELECT passed, status FROM verdicts WHERE code_hash = ? AND test_hash = ? AND settings = ?",
+                    (code_hash, test_hash, settings)
+                ).fetchone()
+                if row is not None:
+                    found[test_hash] = (bool(row[0]), row[1])
+            self.hits += len(found)
+            self.misses += len(set(test_hashes)) - len(found)
+        return found
+
+    def store(self, code_hash: str, settings: str, rows: List[Tuple[str, bool, Dict]]) -> None:
+        """
+        Record verdicts.
+
+        Args:
+            code_hash (str): Hash of the candidate code.
+            settings (str): Evaluation settings the verdicts were produced under.
+            rows (List[Tuple[str, bool, Dict]]): (test digest, passed, run result) for each test.
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (code_hash, test_hash, settings, int(passed), result.get("status", ""),
+                     result.get("time_elapsed", 0), result.get("cpu_time", 0), output_digest(result["stdout"]))
+                    for test_hash, passed, result in rows
+                ]
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+_default_cache: Optional[VerdictCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_verdict_cache() -> VerdictCache:
+    """Return the process-wide verdict cache, opening it on first use."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = VerdictCache()
+        return _default_cache
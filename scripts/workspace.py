@@ -0,0 +1,138 @@
+import os
+import queue
+import atexit
+import shutil
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+
+def default_workspace_root() -> str:
+    """Prefer a RAM-backed tmpfs for workspaces and fall back to the on-disk tmp directory."""
+    shm = "/dev/shm"
+    if os.path.isdir(shm) and os.access(shm, os.W_OK | os.X_OK):
+        return os.path.join(shm, "code_contest")
+    return os.path.abspath("tmp")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class Workspace:
+    """A private directory holding one candidate's source and executable."""
+    def __init__(self, path: str):
+        self.path = path
+        self.cpp_path = os.path.join(path, "main.cpp")
+        self.exe_path = os.path.join(path, "main.exe")
+        self.memfd: Optional[int] = None
+        os.makedirs(path, exist_ok=True)
+
+    def load_executable(self) -> Tuple[str, Tuple[int, ...]]:
+        """
+        Move the compiled executable into an anonymous in-memory file where the platform supports it.
+
+        Returns:
+            Tuple[str, Tuple[int, ...]]: The path to execute and the file descriptors the child must inherit for it.
+        """
+        if not hasattr(os, "memfd_create"):
+            return self.exe_path, ()
+
+        fd = os.memfd_create("candidate")
+        try:
+            with open(self.exe_path, "rb") as exe, open(fd, "wb", closefd=False) as mem:
+                shutil.copyfileobj(exe, mem)
+        except OSError:
+            os.close(fd)
+            return self.exe_path, ()
+        self.memfd = fd
+        os.remove(self.exe_path)
+        # The child inherits the descriptor under the same number and executes it through procfs
+        return f"/proc/self/fd/{fd}", (fd,)
+
+    def reset(self):
+        """Drop the memfd and every file left in the workspace so it can be reused."""
+        if self.memfd is not None:
+            os.close(self.memfd)
+            self.memfd = None
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+class WorkspacePool:
+    """
+    Pool of reusable workspaces under a (preferably tmpfs) root directory.
+
+    Workspaces are named `ws-<pid>-<n>`; the ones left behind by processes that
+    crashed are removed when a pool starts, and this process's are removed at exit.
+    """
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or default_workspace_root()
+        self._free = queue.SimpleQueue()
+        self._all = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+        os.makedirs(self.root, exist_ok=True)
+        self._remove_stale()
+        atexit.register(self.close)
+
+    def _remove_stale(self):
+        for name in os.listdir(self.root):
+            parts = name.split("-")
+            if len(parts) == 3 and parts[0] == "ws" and parts[1].isdigit():
+                pid = int(parts[1])
+                if pid != os.getpid() and not _pid_alive(pid):
+                    shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    @contextmanager
+    def acquire(self):
+        """Borrow a clean workspace for the duration of the `with` block."""
+        try:
+            workspace = self._free.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                workspace = Workspace(os.path.join(self.root, f"ws-{os.getpid()}-{next(self._counter)}"))
+                self._all.append(workspace)
+        try:
+            yield workspace
+        finally:
+            workspace.reset()
+            self._free.put(workspace)
+
+    def close(self):
+        """Remove every workspace created by this pool."""
+        with self._lock:
+            for workspace in self._all:
+                if workspace.memfd is not None:
+                    os.close(workspace.memfd)
+                    workspace.memfd = None
+                shutil.rmtree(workspace.path, ignore_errors=True)
+            self._all = []
+
+
+_default_pool: Optional[WorkspacePool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_workspace_pool() -> WorkspacePool:
+    """Return the process-wide workspace pool, creating it on first use."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = WorkspacePool()
+        return _default_pool